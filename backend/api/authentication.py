@@ -0,0 +1,106 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.constants import AUTH_TOKEN_CACHE_SIZE
+
+
+def token_cache_key(key):
+    return f'auth_token:{key}'
+
+
+class TokenCache:
+    """LRU-кеш токенов в памяти процесса с временем жизни записей."""
+
+    def __init__(self, maxsize=AUTH_TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            value = cache.get(token_cache_key(key))
+            if value is not None:
+                self.set_local(key, value)
+                return value
+        return None
+
+    def set_local(self, key, value):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + settings.AUTH_TOKEN_LOCAL_TTL, value
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        self.set_local(key, value)
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            cache.set(
+                token_cache_key(key), value, settings.AUTH_TOKEN_CACHE_TTL
+            )
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            cache.delete_many([token_cache_key(key) for key in keys])
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает все токены пользователя."""
+        with self._lock:
+            keys = {
+                key for key, (_, (user, _)) in self._entries.items()
+                if user.pk == user_id
+            }
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            keys.update(
+                Token.objects.filter(user_id=user_id)
+                .values_list('key', flat=True)
+            )
+        self.invalidate(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который не ходит в базу за уже известным токеном.
+    Записи сбрасываются при выходе, смене пароля, деактивации и любом
+    другом сохранении пользователя (см. api.signals).
+    """
+
+    def authenticate_credentials(self, key):
+        if len(key) > Token._meta.get_field('key').max_length:
+            # Такого токена нет, а длинный ключ не примет memcached.
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, (user, token))
+            cached = (user, token)
+        user, token = cached
+        # Каждый запрос получает свою копию, чтобы изменения request.user
+        # не переходили между потоками.
+        return copy.copy(user), token
@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import IngredientSerializer, TagSerializer
+from api.utiles import bump_cache_version, get_cache_version
+from foodgram.constants import CATALOG_CACHE_TIMEOUT
+from recipes.models import Ingredient, Tag
+
+
+class CatalogCache:
+    """Кеш готового JSON-ответа справочника с версией в кеше Django."""
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.version_key = f'catalog:{name}:version'
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def bump(self):
+        bump_cache_version(self.version_key, CATALOG_CACHE_TIMEOUT)
+
+    def get_version(self):
+        return get_cache_version(self.version_key, CATALOG_CACHE_TIMEOUT)
+
+    def build(self):
+        data = self.serializer_class(
+            self.queryset.using(DEFAULT_DB_ALIAS), many=True
+        ).data
+        body = JSONRenderer().render(data)
+        return {
+            'body': body,
+            'gzip': gzip.compress(body),
+            'etag': f'"{hashlib.sha1(body).hexdigest()}"',
+        }
+
+    def get_entry(self):
+        version = self.get_version()
+        entry = self._entry
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            body_key = f'catalog:{self.name}:{version}'
+            content = cache.get(body_key)
+            if content is None:
+                content = self.build()
+                cache.set(body_key, content, CATALOG_CACHE_TIMEOUT)
+            self._entry = (version, content)
+            return content
+
+    def response(self, request):
+        """Ответ из кеша: 304 при совпадении ETag, gzip если принимается."""
+        content = self.get_entry()
+        if content['etag'] in parse_etags(
+            request.headers.get('If-None-Match', '')
+        ):
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(
+                content['gzip'], content_type='application/json'
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                content['body'], content_type='application/json'
+            )
+        response['ETag'] = content['etag']
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+tag_catalog = CatalogCache('tags', Tag.objects.all(), TagSerializer)
+ingredient_catalog = CatalogCache(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer
+)
+
+
+def tag_ids_by_slug():
+    """Соответствие slug -> id тегов из кеша справочника тегов."""
+    content = tag_catalog.get_entry()
+    if 'ids_by_slug' not in content:
+        content['ids_by_slug'] = {
+            tag['slug']: tag['id'] for tag in json.loads(content['body'])
+        }
+    return content['ids_by_slug']
@@ -1,18 +1,31 @@
 import django_filters
+from django import forms
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.catalog import tag_ids_by_slug
+from recipes.models import Recipe
+from recipes.search import search_recipes
+
+
+class SlugListField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [slug for slug in value or [] if slug]
+
+
+class SlugListFilter(django_filters.Filter):
+    """Фильтр по списку значений из повторяющегося параметра."""
+
+    field_class = SlugListField
 
 
 class RecipeFilter(django_filters.FilterSet):
     """Кастомный фильтр для рецептов."""
 
     name = django_filters.CharFilter(lookup_expr='icontains')
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-        conjoined=False
-    )
+    search = django_filters.CharFilter(method='filter_search')
+    tags = SlugListFilter(method='filter_tags')
     author = django_filters.NumberFilter()
     is_favorited = django_filters.NumberFilter(
         field_name='favorited', method='filter_is_favorited'
@@ -25,12 +38,40 @@ class RecipeFilter(django_filters.FilterSet):
         model = Recipe
         fields = [
             'name',
+            'search',
             'tags',
             'author',
             'is_in_shopping_cart',
             'is_favorited'
         ]
 
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по релевантности."""
+        return search_recipes(queryset, value)
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтр по slug тегов через EXISTS без JOIN по тегам.
+        По умолчанию рецепт подходит, если у него есть любой из тегов;
+        с tags_mode=all — только если есть все.
+        """
+        ids_by_slug = tag_ids_by_slug()
+        tag_ids = {ids_by_slug[slug] for slug in value if slug in ids_by_slug}
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if self.data.get('tags_mode') == 'all':
+            if len(tag_ids) < len(set(value)):
+                return queryset.none()
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id))
+                )
+            return queryset
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
     def filter_is_favorited(self, queryset, name, value):
         """Фильтр избранных рецептов для текущего пользователя"""
         user = self.request.user
@@ -48,11 +89,3 @@ class RecipeFilter(django_filters.FilterSet):
         if value:
             return queryset.filter(shopping_carted=user)
         return queryset.exclude(shopping_carted=user)
-
-
-class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
-
-    class Meta:
-        model = Ingredient
-        fields = ['name']
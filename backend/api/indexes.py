@@ -0,0 +1,69 @@
+import threading
+import time
+
+from django.db import connection
+
+
+class ReloadableIndex:
+    """Индекс в памяти процесса, который по истечении ttl пересобирается."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded_at = None
+        self._rebuilding = False
+        self._generation = 0
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    def _is_stale(self):
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > self.ttl
+        )
+
+    def _ensure_loaded(self):
+        if not self._is_stale():
+            return
+        if self._loaded_at is None:
+            # Отвечать пока не по чему: загружаем в запросе.
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self._reload()
+            return
+        # Устаревший индекс отвечает, пока новый строится в фоне.
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._reload_in_background, daemon=True
+        ).start()
+
+    def _reload_in_background(self):
+        try:
+            self._reload()
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def _reload(self):
+        generation = self._generation
+        self.build(self.load())
+        if generation != self._generation:
+            # Сброшен во время сборки: данные могли уже устареть.
+            self._loaded_at = None
+
+    def load(self):
+        """Строки из базы, из которых build() строит индекс."""
+        raise NotImplementedError
+
+    def build(self, rows):
+        """
+        Строит индекс из rows, не держа блокировку, и подменяет им
+        текущий под блокировкой, отмечая время загрузки.
+        """
+        raise NotImplementedError
@@ -1,6 +1,135 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from collections import OrderedDict, namedtuple
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.utiles import parse_limit
+
+CursorKey = namedtuple('CursorKey', ['created_at', 'pk'])
 
 
 class CustomPageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 10
+
+
+class KeysetCursorPaginator(BasePagination):
+    """Пагинация по ключу (created_at, id) по параметру ?cursor=."""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = CustomPageNumberPaginator.page_size_query_param
+    page_size = CustomPageNumberPaginator.page_size
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        return parse_limit(
+            request.query_params.get(self.page_size_query_param),
+            self.page_size
+        )
+
+    def encode_cursor(self, reverse, obj):
+        raw = f'{int(reverse)}|{obj.created_at.isoformat()}|{obj.pk}'
+        return b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            reverse, created_at, pk = (
+                b64decode(encoded.encode()).decode().split('|')
+            )
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return bool(int(reverse)), created_at, int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def fetch(self, queryset, cursor, limit, key_field='id'):
+        """
+        Не более limit объектов после курсора в порядке обхода.
+        key_field — поле id рецепта, второе поле ключа после created_at.
+        """
+        if cursor is None:
+            queryset = queryset.order_by('-created_at', f'-{key_field}')
+        elif not self.reverse:
+            _, created_at, pk = cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at)
+                | Q(created_at=created_at, **{f'{key_field}__lt': pk})
+            ).order_by('-created_at', f'-{key_field}')
+        else:
+            _, created_at, pk = cursor
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at)
+                | Q(created_at=created_at, **{f'{key_field}__gt': pk})
+            ).order_by('created_at', key_field)
+        return list(queryset[:limit])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor[0]
+        results = self.fetch(queryset, cursor, page_size + 1)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(False, self.page[-1])
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(True, self.page[0])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class MergedCursorPaginator(KeysetCursorPaginator):
+    """Keyset-пагинация, сливающая ключи рецептов из нескольких источников."""
+
+    def fetch(self, sources, cursor, limit):
+        """
+        sources — пары (queryset, key_field). Возвращает CursorKey
+        без повторов; рецепты по ним загружает вызывающий код.
+        """
+        keys = {}
+        for queryset, key_field in sources:
+            for created_at, pk in super().fetch(
+                queryset.values_list('created_at', key_field),
+                cursor, limit, key_field
+            ):
+                keys[pk] = CursorKey(created_at, pk)
+        return sorted(keys.values(), reverse=not self.reverse)[:limit]
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Prefetch
+
+from api.serializers import RecipeReadSerializer
+from api.utiles import (
+    bump_cache_version,
+    get_cache_version,
+    get_subscription_ids
+)
+from foodgram.constants import RECIPE_REPR_CACHE_TIMEOUT
+from recipes.models import Recipe, RecipeIngredient
+
+
+class RecipeRepresentationCache:
+    """Кеш представлений рецептов без пользовательских флагов."""
+
+    version_key = 'recipe_repr:version'
+
+    def bump(self):
+        bump_cache_version(self.version_key)
+
+    def get_version(self):
+        return get_cache_version(self.version_key)
+
+    def make_key(self, version, recipe_id):
+        return f'recipe_repr:{version}:{recipe_id}'
+
+    def invalidate(self, recipe_ids):
+        version = self.get_version()
+        cache.delete_many(
+            [self.make_key(version, recipe_id) for recipe_id in recipe_ids]
+        )
+
+    def build(self, request, recipe_ids):
+        """
+        Сериализует рецепты без пользовательских флагов. Читает из
+        primary: отставшая реплика надолго закешировала бы старые данные.
+        """
+        recipes = list(
+            Recipe.objects.using(DEFAULT_DB_ALIAS)
+            .filter(id__in=recipe_ids)
+            .defer('search_vector')
+            .select_related('author')
+            .prefetch_related(
+                'tags',
+                Prefetch(
+                    'recipe_ingredient',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+            )
+        )
+        for recipe in recipes:
+            recipe.is_favorited = recipe.is_in_shopping_cart = False
+        data = RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+        return {item['id']: item for item in data}
+
+    def get_bodies(self, request, recipe_ids):
+        base = request.build_absolute_uri('/')
+        version = self.get_version()
+        keys = {
+            recipe_id: self.make_key(version, recipe_id)
+            for recipe_id in recipe_ids
+        }
+        cached = cache.get_many(keys.values())
+        bodies = {}
+        for recipe_id, key in keys.items():
+            entry = cached.get(key)
+            # Абсолютные URL картинок зависят от хоста.
+            if entry is not None and entry['base'] == base:
+                bodies[recipe_id] = entry['body']
+        missing = [
+            recipe_id for recipe_id in recipe_ids if recipe_id not in bodies
+        ]
+        if missing:
+            built = self.build(request, missing)
+            cache.set_many(
+                {
+                    keys[recipe_id]: {'base': base, 'body': body}
+                    for recipe_id, body in built.items()
+                },
+                RECIPE_REPR_CACHE_TIMEOUT
+            )
+            bodies.update(built)
+        return bodies
+
+    def render(self, request, recipes):
+        """
+        Представления рецептов в порядке recipes. Рецепты должны быть
+        аннотированы флагами Recipe.objects.with_flags.
+        """
+        bodies = self.get_bodies(request, [recipe.id for recipe in recipes])
+        subscription_ids = get_subscription_ids(request)
+        data = []
+        for recipe in recipes:
+            body = dict(bodies[recipe.id])
+            body['author'] = dict(body['author'])
+            body['is_favorited'] = recipe.is_favorited
+            body['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+            body['author']['is_subscribed'] = (
+                recipe.author_id in subscription_ids
+            )
+            data.append(body)
+        return data
+
+
+recipe_cache = RecipeRepresentationCache()
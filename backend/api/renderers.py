@@ -0,0 +1,120 @@
+import csv
+import io
+
+from django.conf import settings
+from django.http import Http404
+from rest_framework import renderers
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from foodgram.constants import (
+    PDF_FONT_SIZE,
+    PDF_LINE_HEIGHT,
+    PDF_MARGIN,
+    STREAM_CHUNK_SIZE
+)
+
+SHOPPING_LIST_TITLE = 'Список покупок:'
+
+
+class Echo:
+    """Псевдобуфер: write возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class FormatParamNegotiation(DefaultContentNegotiation):
+    """
+    Выбирает рендерер только по ?format=, заголовок Accept не учитывается.
+    Без параметра используется первый рендерер.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        format = format_suffix or request.query_params.get(format_query_param)
+        if format is None:
+            return renderers[0], renderers[0].media_type
+        for renderer in renderers:
+            if renderer.format == format:
+                return renderer, renderer.media_type
+        raise Http404
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый рендерер списка покупок, отдающий файл кусками."""
+
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        encoding = self.charset or 'utf-8'
+        if isinstance(data, dict):
+            return '\n'.join(
+                f'{key}: {value}' for key, value in data.items()
+            ).encode(encoding)
+        return b''.join(
+            chunk.encode(encoding) if isinstance(chunk, str) else chunk
+            for chunk in self.stream(data)
+        )
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_LIST_TITLE}\n\n'
+        for name, measurement_unit, total_amount in rows:
+            yield f'{name}: {total_amount}{measurement_unit}\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(['Ингредиент', 'Количество', 'Единица'])
+        for name, measurement_unit, total_amount in rows:
+            yield writer.writerow([name, total_amount, measurement_unit])
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF-рендерер на reportlab."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+
+    def stream(self, rows):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+            )
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = height - PDF_MARGIN
+        pdf.setFont(self.font_name, PDF_FONT_SIZE)
+        pdf.drawString(PDF_MARGIN, y, SHOPPING_LIST_TITLE)
+        y -= 2 * PDF_LINE_HEIGHT
+        for name, measurement_unit, total_amount in rows:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(self.font_name, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(
+                PDF_MARGIN, y, f'{name}: {total_amount}{measurement_unit}'
+            )
+            y -= PDF_LINE_HEIGHT
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(STREAM_CHUNK_SIZE), b'')
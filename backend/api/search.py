@@ -0,0 +1,101 @@
+import bisect
+import time
+from collections import defaultdict
+
+from api.indexes import ReloadableIndex
+from foodgram.constants import INGREDIENT_INDEX_TTL, NGRAM_SIZE
+from recipes.models import Ingredient
+
+
+def normalize(text):
+    """Приводит строку к виду для поиска: нижний регистр, ё -> е."""
+    return text.strip().lower().replace('ё', 'е')
+
+
+class IngredientSearchIndex(ReloadableIndex):
+    """Поиск ингредиентов по префиксу и подстроке названия."""
+
+    def __init__(self, ngram_size=NGRAM_SIZE, ttl=INGREDIENT_INDEX_TTL):
+        super().__init__(ttl)
+        self.ngram_size = ngram_size
+        self._state = ([], [], {})
+
+    def load(self):
+        return Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        )
+
+    def build(self, rows):
+        """Строит индекс из кортежей (id, name, measurement_unit)."""
+        entries = sorted((
+            (normalize(name), {
+                'id': pk, 'name': name, 'measurement_unit': unit
+            })
+            for pk, name, unit in rows
+        ), key=lambda entry: (entry[0], entry[1]['id']))
+        ngrams = defaultdict(set)
+        for position, (key, _) in enumerate(entries):
+            for gram in self._split(key):
+                ngrams[gram].add(position)
+        state = (
+            [key for key, _ in entries],
+            [item for _, item in entries],
+            dict(ngrams),
+        )
+        with self._lock:
+            self._state = state
+            self._loaded_at = time.monotonic()
+
+    def _split(self, text):
+        size = self.ngram_size
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    @staticmethod
+    def _prefix_positions(keys, query):
+        start = bisect.bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        return range(start, end)
+
+    def _substring_positions(self, keys, ngrams, query):
+        if len(query) < self.ngram_size:
+            candidates = range(len(keys))
+        else:
+            grams = sorted(
+                self._split(query), key=lambda gram: len(ngrams.get(gram, ()))
+            )
+            candidates = set(ngrams.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not candidates:
+                    break
+                candidates &= ngrams.get(gram, set())
+            candidates = sorted(candidates)
+        return [
+            position for position in candidates if query in keys[position]
+        ]
+
+    def search(self, query, limit=None):
+        """
+        Возвращает ингредиенты, название которых начинается с query,
+        а за ними — содержащие query в середине названия.
+        """
+        self._ensure_loaded()
+        keys, items, ngrams = self._state
+        query = normalize(query)
+        if not query:
+            return items[:limit]
+        prefix = self._prefix_positions(keys, query)
+        results = [items[position] for position in prefix]
+        if limit is not None and len(results) >= limit:
+            return results[:limit]
+        for position in self._substring_positions(keys, ngrams, query):
+            if position in prefix:
+                continue
+            results.append(items[position])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
+ingredient_index = IngredientSearchIndex()
@@ -1,28 +1,64 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
 from foodgram import constants, fields
+from api.utiles import (
+    change_cart_totals,
+    change_counter,
+    get_subscription_ids,
+    invalidate_subscription_ids
+)
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.timeline import fan_out_recipe, follow_author
 
 User = get_user_model()
 
 
 def ingredients_create(ingredients_data, recipe):
-    recipe_ingredients = []
-    for ingredient_data in ingredients_data:
-        ingredient = Ingredient.objects.get(
-            id=ingredient_data['ingredient']['id']
-        )
-        recipe_ingredients.append(
-            RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient,
-                amount=ingredient_data['amount']
-            )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient_id=ingredient_data['ingredient']['id'],
+            amount=ingredient_data['amount']
         )
-    RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        for ingredient_data in ingredients_data
+    )
+
+
+def ingredients_update(ingredients_data, recipe):
+    """
+    Применяет к ингредиентам рецепта только разницу с новым списком.
+    Пока состав меняется, суммы корзин с этим рецептом пересчитываются.
+    """
+    existing = {
+        recipe_ingredient.ingredient_id: recipe_ingredient
+        for recipe_ingredient in recipe.recipe_ingredient.all()
+    }
+    to_create = []
+    to_update = []
+    for ingredient_data in ingredients_data:
+        ingredient_id = ingredient_data['ingredient']['id']
+        recipe_ingredient = existing.pop(ingredient_id, None)
+        if recipe_ingredient is None:
+            to_create.append(ingredient_data)
+        elif recipe_ingredient.amount != ingredient_data['amount']:
+            recipe_ingredient.amount = ingredient_data['amount']
+            to_update.append(recipe_ingredient)
+    if not (existing or to_update or to_create):
+        return
+    change_cart_totals(recipe.id, -1)
+    if existing:
+        RecipeIngredient.objects.filter(
+            id__in=[item.id for item in existing.values()]
+        ).delete()
+    if to_update:
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+    if to_create:
+        ingredients_create(to_create, recipe)
+    change_cart_totals(recipe.id, 1)
 
 
 class UserStartSerializer(serializers.ModelSerializer):
@@ -69,10 +105,7 @@ class UserReadSerializer(UserStartSerializer):
         ]
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return user.subscriptions.filter(id=obj.id).exists()
+        return obj.id in get_subscription_ids(self.context['request'])
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -84,10 +117,15 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 
 class RecipeUserSerializer(serializers.ModelSerializer):
+    image_thumbnail = fields.ImageVariantField('thumbnail', source='image')
+    image_webp = fields.ImageVariantField('webp', source='image')
 
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = [
+            'id', 'name', 'image', 'image_thumbnail', 'image_webp',
+            'cooking_time'
+        ]
 
 
 class SubscriptionSerializer(serializers.Serializer):
@@ -110,13 +148,19 @@ class SubscriptionSerializer(serializers.Serializer):
             User,
             id=validated_data['target_user_id']
         )
-        user.subscriptions.add(target_user)
+        with transaction.atomic():
+            user.subscriptions.add(target_user)
+            change_counter(User, target_user.id, 'subscribers_count', 1)
+            follow_author(user.id, target_user.id)
+        invalidate_subscription_ids(self.context['request'])
         return target_user
 
 
 class SubscribeUserSerializer(UserReadSerializer):
-    recipes_count = serializers.SerializerMethodField()
-    recipes = RecipeUserSerializer(many=True)
+    recipes_count = serializers.IntegerField(read_only=True)
+    recipes = RecipeUserSerializer(
+        source='limited_recipes', many=True, read_only=True
+    )
 
     class Meta:
         model = User
@@ -124,9 +168,6 @@ class SubscribeUserSerializer(UserReadSerializer):
             'recipes', 'recipes_count'
         ]
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class IngredientSerializer(serializers.ModelSerializer):
 
@@ -188,26 +229,34 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.favorited.filter(id=user.id).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.shopping_carted.filter(id=user.id).exists()
         return False
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredient')
         tags_data = validated_data.pop('tags')
         user = self.context['request'].user
         recipe = Recipe.objects.create(author=user, **validated_data)
+        change_counter(User, user.id, 'recipes_count', 1)
         recipe.tags.set(tags_data)
         ingredients_create(ingredients_data, recipe)
+        fan_out_recipe(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredient', None)
         if ingredients_data is None:
@@ -217,25 +266,30 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Теги обязательны.')
         instance = super().update(instance, validated_data)
         instance.tags.set(tags_data)
-        instance.recipe_ingredient.all().delete()
-        ingredients_create(ingredients_data, instance)
+        ingredients_update(ingredients_data, instance)
         return instance
 
     def validate_ingredients(self, value):
         if not value:
             raise serializers.ValidationError('Ингредиенты обязательны.')
-        ingredient_ids = set()
+        ingredient_ids = []
         for ingredient_data in value:
             ingredient_id = ingredient_data['ingredient']['id']
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
-                raise serializers.ValidationError(
-                    f'Ингредиент с id {ingredient_id} не существует.'
-                )
             if ingredient_id in ingredient_ids:
                 raise serializers.ValidationError(
                     f'Ингредиент с id {ingredient_id} повторяется в списке.'
                 )
-            ingredient_ids.add(ingredient_id)
+            ingredient_ids.append(ingredient_id)
+        existing_ids = set(
+            Ingredient.objects
+            .filter(id__in=ingredient_ids)
+            .values_list('id', flat=True)
+        )
+        for ingredient_id in ingredient_ids:
+            if ingredient_id not in existing_ids:
+                raise serializers.ValidationError(
+                    f'Ингредиент с id {ingredient_id} не существует.'
+                )
         return value
 
     def validate_tags(self, value):
@@ -261,3 +315,10 @@ class RecipeWriteSerializer(RecipeSerializer):
 
 class RecipeReadSerializer(RecipeSerializer):
     tags = TagSerializer(many=True)
+    image_thumbnail = fields.ImageVariantField('thumbnail', source='image')
+    image_webp = fields.ImageVariantField('webp', source='image')
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            'image_thumbnail', 'image_webp'
+        ]
@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.catalog import ingredient_catalog, tag_catalog
+from api.recipe_cache import recipe_cache
+from api.search import ingredient_index
+from api.similarity import similarity_index
+from api.utiles import (
+    change_cart_totals,
+    recipe_card_cache_key,
+    resolve_short_code
+)
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import ingredients_imported
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver(ingredients_imported)
+def invalidate_ingredient_caches(**kwargs):
+    """
+    Сбрасывает поисковый индекс и кеш справочника ингредиентов после
+    коммита: иначе параллельный запрос закеширует под новой версией
+    ещё старые данные.
+    """
+    transaction.on_commit(ingredient_index.invalidate)
+    transaction.on_commit(ingredient_catalog.bump)
+    transaction.on_commit(recipe_cache.bump)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_catalog(**kwargs):
+    transaction.on_commit(tag_catalog.bump)
+    transaction.on_commit(recipe_cache.bump)
+
+
+@receiver(post_delete, sender=Recipe)
+def clear_short_link_cache(**kwargs):
+    """Удалённый рецепт не должен открываться по закешированной ссылке."""
+    resolve_short_code.cache_clear()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_cart_totals(instance, **kwargs):
+    """Удалённый рецепт уходит из корзин вместе со своими ингредиентами."""
+    change_cart_totals(instance.pk, -1)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe_card(instance, **kwargs):
+    cache.delete(recipe_card_cache_key(instance.pk))
+    invalidate_recipe_representation(instance.pk)
+
+
+def invalidate_recipe_representation(recipe_id):
+    """
+    Теги и ингредиенты рецепта меняются уже после его сохранения
+    в той же транзакции, поэтому запись сбрасывается после коммита.
+    """
+    transaction.on_commit(lambda: recipe_cache.invalidate([recipe_id]))
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    invalidate_recipe_representation(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        transaction.on_commit(recipe_cache.bump)
+    else:
+        invalidate_recipe_representation(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def update_similarity_index(instance, **kwargs):
+    """Состав рецепта переиндексируется после коммита, как и кеш."""
+    recipe_id = getattr(instance, 'recipe_id', instance.pk)
+    transaction.on_commit(lambda: similarity_index.update(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_similarity_index(instance, **kwargs):
+    similarity_index.remove(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    """Выход через djoser удаляет токен, кеш должен забыть его сразу."""
+    token_cache.invalidate([instance.key])
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    """
+    Смена пароля, деактивация и другие изменения пользователя
+    сбрасывают его закешированные токены. Обновление last_login
+    при входе на них не влияет.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields=None,
+                              **kwargs):
+    """Данные автора входят в закешированные представления рецептов."""
+    if created or (
+        update_fields is not None and set(update_fields) <= {'last_login'}
+    ):
+        return
+    recipe_cache.invalidate(
+        Recipe.objects.filter(author_id=instance.pk)
+        .values_list('id', flat=True)
+    )
@@ -0,0 +1,126 @@
+import heapq
+import time
+from collections import defaultdict
+
+from api.indexes import ReloadableIndex
+from foodgram.constants import SIMILARITY_INDEX_TTL
+from recipes.models import RecipeIngredient
+
+
+class RecipeSimilarityIndex(ReloadableIndex):
+    """Похожие рецепты по коэффициенту Жаккара наборов ингредиентов."""
+
+    def __init__(self, ttl=SIMILARITY_INDEX_TTL):
+        super().__init__(ttl)
+        # Рецепты, изменённые во время фоновой сборки.
+        self._touched = set()
+        self._ingredients = {}
+        self._postings = defaultdict(set)
+
+    def load(self):
+        return RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator()
+
+    def _reload(self):
+        with self._lock:
+            self._touched = set()
+        super()._reload()
+
+    def build(self, rows):
+        """
+        Строит индекс из пар (recipe_id, ingredient_id).
+        Рецепты, изменённые во время сборки, перечитываются.
+        """
+        ingredients = defaultdict(set)
+        postings = defaultdict(set)
+        for recipe_id, ingredient_id in rows:
+            ingredients[recipe_id].add(ingredient_id)
+            postings[ingredient_id].add(recipe_id)
+        ingredients = {
+            recipe_id: frozenset(ids) for recipe_id, ids in ingredients.items()
+        }
+        with self._lock:
+            self._ingredients = ingredients
+            self._postings = postings
+            self._loaded_at = time.monotonic()
+            touched, self._touched = self._touched, set()
+        for recipe_id in touched:
+            self.update(recipe_id)
+
+    def _unlink(self, recipe_id):
+        if self._rebuilding:
+            self._touched.add(recipe_id)
+        for ingredient_id in self._ingredients.pop(recipe_id, ()):
+            self._postings[ingredient_id].discard(recipe_id)
+            if not self._postings[ingredient_id]:
+                del self._postings[ingredient_id]
+
+    def update(self, recipe_id):
+        """Перечитывает ингредиенты одного рецепта."""
+        if self._loaded_at is None:
+            return
+        ingredient_ids = frozenset(
+            RecipeIngredient.objects.filter(recipe_id=recipe_id)
+            .values_list('ingredient_id', flat=True)
+        )
+        with self._lock:
+            self._unlink(recipe_id)
+            if ingredient_ids:
+                self._ingredients[recipe_id] = ingredient_ids
+                for ingredient_id in ingredient_ids:
+                    self._postings[ingredient_id].add(recipe_id)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            self._unlink(recipe_id)
+
+    def similar(self, recipe_id, limit):
+        """
+        До limit пар (recipe_id, похожесть) по убыванию похожести.
+        None, если рецепта нет в индексе.
+
+        Списки рецептов обходятся от редких ингредиентов к частым.
+        Рецепт, не встретившийся до последних remaining ингредиентов,
+        не может быть похож больше чем на remaining / len(ingredients),
+        поэтому обход останавливается, как только худший из limit
+        найденных рецептов уже лучше этой границы.
+        """
+        self._ensure_loaded()
+        if recipe_id not in self._ingredients:
+            # Рецепт мог быть создан в другом процессе.
+            self.update(recipe_id)
+        with self._lock:
+            ingredient_ids = self._ingredients.get(recipe_id)
+            if ingredient_ids is None:
+                return None
+            postings = sorted(
+                (self._postings[ingredient_id]
+                 for ingredient_id in ingredient_ids),
+                key=len
+            )
+            size = len(ingredient_ids)
+            seen = {recipe_id}
+            best = []
+            for position, posting in enumerate(postings):
+                remaining = size - position
+                if len(best) == limit and best[0][0] > remaining / size:
+                    break
+                for other_id in posting - seen:
+                    seen.add(other_id)
+                    other = self._ingredients[other_id]
+                    overlap = len(ingredient_ids & other)
+                    score = (
+                        overlap / (size + len(other) - overlap), other_id
+                    )
+                    if len(best) < limit:
+                        heapq.heappush(best, score)
+                    elif score > best[0]:
+                        heapq.heapreplace(best, score)
+        return [
+            (other_id, score)
+            for score, other_id in sorted(best, reverse=True)
+        ]
+
+
+similarity_index = RecipeSimilarityIndex()
@@ -0,0 +1,515 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.authentication import token_cache
+from api.catalog import ingredient_catalog
+from api.search import ingredient_index
+from api.utiles import (
+    create_shopping_list,
+    generate_short_code,
+    rebuild_cart_totals
+)
+from recipes.models import (
+    CartIngredientTotal,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    TimelineEntry
+)
+from recipes.timeline import fan_out_recipe
+
+User = get_user_model()
+
+RECIPES_COUNT = 25
+PAGE_SIZES = (5, 20)
+
+
+class IngredientSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'абрикос {number}', measurement_unit='г')
+            for number in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def search(self, limit):
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'абр', 'limit': limit}
+        )
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_limit(self):
+        self.assertEqual(len(self.search('2')), 2)
+
+    def test_invalid_limit_is_ignored(self):
+        for limit in ('x', '0', '-2'):
+            with self.subTest(limit=limit):
+                self.assertEqual(len(self.search(limit)), 5)
+
+
+class RecipeQueryBudgetTests(APITestCase):
+    """
+    Список и карточка рецепта обходятся фиксированным числом запросов
+    независимо от размера страницы. С холодными кешами добавляются
+    запросы на сборку представлений, токен и подписки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Читатель', password='pass'
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Автор', last_name='Автор', password='pass'
+            )
+            for number in range(3)
+        ]
+        cls.user.subscriptions.add(authors[0])
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in ingredients[:number % 3 + 2]
+            )
+            if number % 4 == 0:
+                recipe.favorited.add(cls.user)
+            if number % 5 == 0:
+                recipe.shopping_carted.add(cls.user)
+        cls.recipe = Recipe.objects.first()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.authorized_client = APIClient()
+        self.authorized_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def assert_list_budget(self, client, cold, warm):
+        for limit in PAGE_SIZES:
+            cache.clear()
+            token_cache.clear()
+            url = f'/api/recipes/?limit={limit}'
+            with self.assertNumQueries(cold):
+                response = client.get(url)
+            self.assertEqual(len(response.data['results']), limit)
+            with self.assertNumQueries(warm):
+                client.get(url)
+
+    def test_list_anonymous(self):
+        self.assert_list_budget(self.client, cold=5, warm=2)
+
+    def test_list_authenticated(self):
+        self.assert_list_budget(self.authorized_client, cold=7, warm=2)
+
+    def retrieve(self, authorized):
+        client = self.authorized_client if authorized else self.client
+        response = client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_detail_anonymous(self):
+        with self.assertNumQueries(4):
+            data = self.retrieve(authorized=False)
+        self.assertFalse(data['is_favorited'])
+        with self.assertNumQueries(1):
+            self.retrieve(authorized=False)
+
+    def test_detail_authenticated(self):
+        with self.assertNumQueries(6):
+            data = self.retrieve(authorized=True)
+        self.assertEqual(
+            data['is_favorited'],
+            self.recipe.favorited.filter(id=self.user.id).exists()
+        )
+        with self.assertNumQueries(1):
+            self.retrieve(authorized=True)
+
+    def test_subscriptions_recipes_limit(self):
+        author_recipes = Recipe.objects.filter(
+            author__subscribers=self.user
+        ).count()
+        for recipes_limit, expected in (
+            ('2', 2), ('x', author_recipes), ('-1', author_recipes),
+        ):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.authorized_client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': recipes_limit}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.data['results'][0]['recipes']), expected
+                )
+
+    def test_short_link_redirect(self):
+        code = generate_short_code(self.recipe.pk)
+        response = self.client.get(f'/s/{code}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            response['Location'].endswith(f'/recipes/{self.recipe.pk}')
+        )
+
+    def test_flags_match_user(self):
+        response = self.authorized_client.get('/api/recipes/?limit=20')
+        for item in response.data['results']:
+            recipe = Recipe.objects.get(pk=item['id'])
+            self.assertEqual(
+                item['is_favorited'],
+                recipe.favorited.filter(id=self.user.id).exists()
+            )
+            self.assertEqual(
+                item['is_in_shopping_cart'],
+                recipe.shopping_carted.filter(id=self.user.id).exists()
+            )
+            self.assertEqual(
+                item['author']['is_subscribed'],
+                self.user.subscriptions.filter(
+                    id=recipe.author_id
+                ).exists()
+            )
+
+
+class RecipeSearchIndexTests(APITestCase):
+    """Поисковый документ обновляется при любом способе записи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Автор', password='pass'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Морковь', measurement_unit='г'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        return [item['id'] for item in response.data['results']]
+
+    def test_cursor_keeps_relevance_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('Суп суп суп', 'Суп'):
+                Recipe.objects.create(
+                    author=self.author, name=name, text='Описание',
+                    image='recipes/images/test.png', cooking_time=10,
+                )
+        expected = self.search('суп')
+        # Более релевантный рецепт старше, keyset поставил бы его вторым.
+        self.assertEqual(expected, sorted(expected))
+        response = self.client.get(
+            '/api/recipes/', {'search': 'суп', 'cursor': ''}
+        )
+        self.assertIn('count', response.data)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], expected
+        )
+
+    def test_document_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name='Суп', text='Описание',
+                image='recipes/images/test.png', cooking_time=10,
+            )
+        self.assertEqual(self.search('суп'), [recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1
+            )
+        self.assertEqual(self.search('морковь'), [recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.name = 'Свёкла'
+            self.ingredient.save()
+        self.assertEqual(self.search('морковь'), [])
+        self.assertEqual(self.search('свекла'), [recipe.id])
+
+
+class CartTotalsTests(APITestCase):
+    """Суммы списка покупок совпадают с пересчётом с нуля."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='cook', email='cook@example.com',
+            first_name='Повар', last_name='Повар', password='pass'
+        )
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com',
+            first_name='Покупатель', last_name='Покупатель', password='pass'
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Блюдо {number}', text='Описание',
+                image='recipes/images/test.png', cooking_time=10,
+            )
+            recipe.tags.add(cls.tag)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=10 * (number + 1)
+                )
+                for ingredient in cls.ingredients[number:number + 2]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.buyer_client = APIClient()
+        self.buyer_client.force_authenticate(self.buyer)
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def totals(self):
+        return dict(
+            CartIngredientTotal.objects.filter(user=self.buyer)
+            .values_list('ingredient_id', 'amount')
+        )
+
+    def assert_totals(self, expected):
+        self.assertEqual(self.totals(), expected)
+        rebuild_cart_totals()
+        self.assertEqual(self.totals(), expected)
+
+    def add_to_cart(self, recipe):
+        response = self.buyer_client.post(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_add_and_remove(self):
+        first, second = self.recipes
+        middle = self.ingredients[1].id
+        self.add_to_cart(first)
+        self.add_to_cart(second)
+        self.assert_totals({
+            self.ingredients[0].id: 10, middle: 30,
+            self.ingredients[2].id: 20,
+        })
+        response = self.buyer_client.delete(
+            f'/api/recipes/{first.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals({middle: 20, self.ingredients[2].id: 20})
+
+    def test_recipe_ingredients_change(self):
+        first, second = self.recipes
+        self.add_to_cart(first)
+        self.add_to_cart(second)
+        response = self.author_client.patch(
+            f'/api/recipes/{first.id}/',
+            {
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': self.ingredients[1].id, 'amount': 5},
+                    {'id': self.ingredients[2].id, 'amount': 7},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals({
+            self.ingredients[1].id: 25, self.ingredients[2].id: 27,
+        })
+
+    def test_download_ignores_accept(self):
+        self.add_to_cart(self.recipes[0])
+        url = '/api/recipes/download_shopping_cart/'
+        cases = [
+            ({}, {}, 'text/plain'),
+            ({}, {'HTTP_ACCEPT': 'application/json'}, 'text/plain'),
+            ({'format': 'csv'}, {'HTTP_ACCEPT': 'application/json'},
+             'text/csv'),
+        ]
+        for params, headers, content_type in cases:
+            with self.subTest(params=params, headers=headers):
+                response = self.buyer_client.get(url, params, **headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type)
+                )
+                b''.join(response.streaming_content)
+        response = self.buyer_client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_recipe_delete(self):
+        first, second = self.recipes
+        self.add_to_cart(first)
+        self.add_to_cart(second)
+        response = self.author_client.delete(f'/api/recipes/{second.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals({
+            self.ingredients[0].id: 10, self.ingredients[1].id: 10,
+        })
+        self.assertEqual(
+            [name for name, _, _ in create_shopping_list(self.buyer)],
+            [self.ingredients[0].name, self.ingredients[1].name]
+        )
+
+
+class CatalogCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_changes_after_commit(self):
+        version = ingredient_catalog.get_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Ingredient.objects.create(name='Шафран', measurement_unit='г')
+            self.assertEqual(ingredient_catalog.get_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(ingredient_catalog.get_version(), version)
+        self.assertIn(
+            'Шафран', ingredient_catalog.get_entry()['body'].decode()
+        )
+
+
+@mock.patch('recipes.timeline.TIMELINE_SIZE', 3)
+class TimelineTests(APITestCase):
+    """Разложенная лента совпадает с последними рецептами подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='follower', email='follower@example.com',
+            first_name='Читатель', last_name='Читатель', password='pass'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'writer{number}',
+                email=f'writer{number}@example.com',
+                first_name='Автор', last_name='Автор', password='pass'
+            )
+            for number in range(2)
+        ]
+        start = timezone.now() - timedelta(days=1)
+        for number in range(8):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 2], name=f'Запись {number}',
+                text='Описание', image='recipes/images/test.png',
+                cooking_time=10,
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                created_at=start + timedelta(minutes=number)
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, author):
+        response = self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+
+    def stored(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.reader)
+            .order_by('-created_at', '-recipe_id')
+            .values_list('recipe_id', flat=True)
+        )
+
+    def expected(self, size=3):
+        return list(
+            Recipe.objects.filter(author__subscribers=self.reader)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)[:size]
+        )
+
+    def test_fan_out_trims_timeline(self):
+        self.subscribe(self.authors[0])
+        self.assertEqual(self.stored(), self.expected())
+        recipe = Recipe.objects.create(
+            author=self.authors[0], name='Новая', text='Описание',
+            image='recipes/images/test.png', cooking_time=10,
+        )
+        fan_out_recipe(recipe)
+        self.assertEqual(self.stored()[0], recipe.id)
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_unfollow_refills_timeline(self):
+        for author in self.authors:
+            self.subscribe(author)
+        self.assertEqual(self.stored(), self.expected())
+        response = self.client.delete(
+            f'/api/users/{self.authors[1].id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stored(), self.expected())
+        self.assertEqual(len(self.stored()), 3)
+
+    def test_is_subscribed_follows_subscription(self):
+        author = self.authors[0]
+
+        def is_subscribed():
+            response = self.client.get(f'/api/users/{author.id}/')
+            return response.data['is_subscribed']
+
+        self.assertFalse(is_subscribed())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscribe(author)
+        self.assertTrue(is_subscribed())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/users/{author.id}/subscribe/')
+        self.assertFalse(is_subscribed())
+
+    def test_feed_pages(self):
+        for author in self.authors:
+            self.subscribe(author)
+        ids = []
+        url = '/api/recipes/feed/?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, self.expected())
@@ -7,7 +7,10 @@ from api.views import (
     IngredientViewSet,
     RecipeViewSet,
     ListUserViewSet,
-    TagViewSet
+    TagViewSet,
+    ingredient_list,
+    recipe_detail,
+    tag_list
 )
 
 
@@ -58,7 +61,16 @@ user_urlpatterns = [
     ),
 ]
 
+# Горячие адреса для чтения обслуживаются async-представлениями,
+# остальное — вьюсетами из роутера.
+async_patterns = [
+    path('recipes/<int:pk>/', recipe_detail),
+    path('tags/', tag_list),
+    path('ingredients/', ingredient_list),
+]
+
 v1_patterns = [
+    path('', include(async_patterns)),
     path('', include(router_v1.urls)),
     path('', include(user_urlpatterns)),
 ]
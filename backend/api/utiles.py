@@ -1,13 +1,81 @@
-import hashlib
-from django.db.models import Sum
+import string
+import uuid
+from collections import defaultdict
+from functools import lru_cache, wraps
 
-from recipes.models import RecipeIngredient
-from foodgram.constants import LENGTH_SHORT_LINK
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    close_old_connections,
+    connection,
+    transaction
+)
+from django.db.models import F, Window
+from django.db.models.functions import Greatest, RowNumber
+from django.http import Http404
 
+from foodgram.constants import (
+    RECIPE_CARD_CACHE_TIMEOUT,
+    SHORT_LINK_CACHE_SIZE,
+    SUBSCRIPTIONS_CACHE_TIMEOUT
+)
+from recipes.models import (
+    CartIngredientTotal,
+    Recipe,
+    RecipeIngredient,
+    ShortLink
+)
 
-def generate_short_code_from_url(url, length=LENGTH_SHORT_LINK):
-    hash_object = hashlib.sha256(url.encode())
-    return hash_object.hexdigest()[:length]
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+def encode_base62(number):
+    """Кодирует неотрицательное целое число в base62."""
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, len(BASE62_ALPHABET))
+        digits.append(BASE62_ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+
+def decode_base62(code):
+    """Декодирует base62-строку; для недопустимых символов ValueError."""
+    number = 0
+    for char in code:
+        number = number * len(BASE62_ALPHABET) + BASE62_ALPHABET.index(char)
+    return number
+
+
+def generate_short_code(recipe_id):
+    """Короткий код рецепта: base62 от его id, без обращения к базе."""
+    return encode_base62(recipe_id)
+
+
+@lru_cache(maxsize=SHORT_LINK_CACHE_SIZE)
+def resolve_short_code(short_code):
+    """
+    Возвращает id рецепта по короткому коду.
+    Сначала проверяет старые коды из ShortLink, затем декодирует base62.
+    Найденные соответствия кешируются в памяти процесса.
+    """
+    recipe_id = (
+        ShortLink.objects
+        .filter(short_code=short_code)
+        .values_list('original_recipe_id', flat=True)
+        .first()
+    )
+    if recipe_id is None:
+        try:
+            recipe_id = decode_base62(short_code)
+        except ValueError:
+            raise Http404
+    if not Recipe.objects.filter(id=recipe_id).exists():
+        raise Http404
+    return recipe_id
 
 
 def get_base_url(request):
@@ -16,18 +84,271 @@ def get_base_url(request):
 
 
 def create_shopping_list(user):
-    ingredients_summary = (
-        RecipeIngredient.objects
-        .filter(recipe__shopping_carted=user)
-        .values('ingredient__name', 'ingredient__measurement_unit')
-        .annotate(total_amount=Sum('amount'))
+    """
+    Возвращает строки списка покупок:
+    (название, единица измерения, суммарное количество).
+    Суммы заранее посчитаны в CartIngredientTotal.
+
+    Строки загружаются сразу: под ASGI потоковый ответ дочитывается
+    в event loop, где ORM недоступен. Их число ограничено числом
+    различных ингредиентов.
+    """
+    return list(
+        CartIngredientTotal.objects
+        .filter(user=user)
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
         .order_by('ingredient__name')
     )
-    shopping_list_text = 'Список покупок:\n\n'
-    for ingredient in ingredients_summary:
-        shopping_list_text += (
-            f"{ingredient['ingredient__name']}: "
-            f"{ingredient['total_amount']}"
-            f"{ingredient['ingredient__measurement_unit']}\n"
+
+
+def cart_tables():
+    quote = connection.ops.quote_name
+    return {
+        'totals': quote(CartIngredientTotal._meta.db_table),
+        'cart': quote(Recipe.shopping_carted.through._meta.db_table),
+        'ingredients': quote(RecipeIngredient._meta.db_table),
+    }
+
+
+def change_cart_totals(recipe_id, sign, user_id=None):
+    """
+    Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта
+    из сумм корзин пользователя user_id или, если он не задан, всех
+    пользователей, у которых рецепт в корзине. Связь с корзиной
+    должна существовать: при удалении функция вызывается до неё.
+    """
+    tables = cart_tables()
+    user_filter = '' if user_id is None else ' AND cart.user_id = %s'
+    params = [recipe_id] + ([] if user_id is None else [user_id])
+    with connection.cursor() as cursor:
+        if sign > 0:
+            cursor.execute(
+                f'INSERT INTO {tables["totals"]} '
+                '(user_id, ingredient_id, amount) '
+                'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+                f'FROM {tables["cart"]} AS cart '
+                f'JOIN {tables["ingredients"]} AS item '
+                'ON item.recipe_id = cart.recipe_id '
+                f'WHERE cart.recipe_id = %s{user_filter} '
+                'GROUP BY cart.user_id, item.ingredient_id '
+                'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {tables["totals"]}.amount + EXCLUDED.amount',
+                params
+            )
+            return
+        users = (
+            f'SELECT cart.user_id FROM {tables["cart"]} AS cart '
+            f'WHERE cart.recipe_id = %s{user_filter}'
+        )
+        cursor.execute(
+            f'UPDATE {tables["totals"]} SET amount = amount - ('
+            f'SELECT SUM(item.amount) FROM {tables["ingredients"]} AS item '
+            'WHERE item.recipe_id = %s '
+            f'AND item.ingredient_id = {tables["totals"]}.ingredient_id) '
+            'WHERE ingredient_id IN ('
+            f'SELECT ingredient_id FROM {tables["ingredients"]} '
+            f'WHERE recipe_id = %s) AND user_id IN ({users})',
+            [recipe_id, recipe_id, *params]
+        )
+        cursor.execute(
+            f'DELETE FROM {tables["totals"]} '
+            f'WHERE amount <= 0 AND user_id IN ({users})',
+            params
+        )
+
+
+def rebuild_cart_totals():
+    """Пересчитывает суммы всех корзин с нуля."""
+    tables = cart_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tables["totals"]}')
+        cursor.execute(
+            f'INSERT INTO {tables["totals"]} '
+            '(user_id, ingredient_id, amount) '
+            'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+            f'FROM {tables["cart"]} AS cart '
+            f'JOIN {tables["ingredients"]} AS item '
+            'ON item.recipe_id = cart.recipe_id '
+            'GROUP BY cart.user_id, item.ingredient_id'
         )
-    return shopping_list_text
+        return cursor.rowcount
+
+
+def parse_limit(value, default=None, maximum=None):
+    """
+    Лимит из параметра запроса: положительное число, не больше maximum.
+    Отсутствующее или неверное значение заменяется на default.
+    """
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    if limit <= 0:
+        return default
+    return limit if maximum is None else min(limit, maximum)
+
+
+def attach_recipes_window(authors, limit):
+    """
+    Подгружает не более limit (None — все) последних рецептов каждого
+    автора одним запросом и кладёт их в атрибут limited_recipes.
+    """
+    authors = list(authors)
+    if not authors:
+        return authors
+    ranked = (
+        Recipe.objects
+        .filter(author__in=authors)
+        .annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .order_by()
+        .only('id', 'name', 'image', 'cooking_time', 'author_id')
+    )
+    sql, params = ranked.query.sql_with_params()
+    limit_filter = '' if limit is None else 'WHERE ranked.row_number <= %s '
+    limit_params = () if limit is None else (limit,)
+    recipes_by_author = defaultdict(list)
+    for recipe in Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) AS ranked {limit_filter}'
+        'ORDER BY ranked.row_number',
+        (*params, *limit_params)
+    ):
+        recipes_by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.limited_recipes = recipes_by_author[author.id]
+    return authors
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет счётчик field у объекта model на delta.
+    Счётчик не опускается ниже нуля, даже если успел разойтись с данными.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def subscriptions_version_key(user_id):
+    return f'subscriptions:{user_id}:version'
+
+
+def get_subscription_ids(request):
+    """
+    Множество id авторов, на которых подписан текущий пользователь.
+    Загружается один раз на запрос и хранится в кеше Django под
+    версией, которая меняется после коммита подписки или отписки.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return frozenset()
+    subscription_ids = getattr(request, '_subscription_ids', None)
+    if subscription_ids is None:
+        # Версия читается до базы: заполнение, начатое до отписки,
+        # уйдёт под старую версию и не будет прочитано.
+        version = get_cache_version(
+            subscriptions_version_key(user.id), SUBSCRIPTIONS_CACHE_TIMEOUT
+        )
+        key = f'subscriptions:{user.id}:{version}'
+        subscription_ids = cache.get(key)
+        if subscription_ids is None:
+            subscription_ids = frozenset(
+                user.subscriptions.values_list('id', flat=True)
+            )
+            cache.set(key, subscription_ids, SUBSCRIPTIONS_CACHE_TIMEOUT)
+        request._subscription_ids = subscription_ids
+    return subscription_ids
+
+
+def invalidate_subscription_ids(request):
+    key = subscriptions_version_key(request.user.id)
+    transaction.on_commit(
+        lambda: bump_cache_version(key, SUBSCRIPTIONS_CACHE_TIMEOUT)
+    )
+    request._subscription_ids = None
+
+
+def add_recipe_relation(through, recipe_id, user):
+    """
+    Добавляет связь рецепта с пользователем одним запросом
+    INSERT ... ON CONFLICT DO NOTHING. Возвращает True, если строка
+    вставлена, и False, если связь уже есть или рецепта нет.
+    """
+    quote = connection.ops.quote_name
+    recipe_table = quote(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(through._meta.db_table)} '
+            '(recipe_id, user_id) '
+            f'SELECT id, %s FROM {recipe_table} WHERE id = %s '
+            'ON CONFLICT DO NOTHING',
+            [user.id, recipe_id]
+        )
+        return cursor.rowcount == 1
+
+
+def get_cache_version(key, timeout=None):
+    """
+    Версия набора записей кеша, хранящаяся под key. Первый обратившийся
+    воркер заводит её, остальные читают уже заведённую.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key, timeout=None):
+    """Меняет версию под key, тем самым сбрасывая все её записи."""
+    cache.set(key, uuid.uuid4().hex, timeout)
+
+
+def recipe_card_cache_key(recipe_id):
+    return f'recipe_card:{recipe_id}'
+
+
+def get_recipe_card(recipe_id):
+    """Рецепт с полями для RecipeUserSerializer, по возможности из кеша."""
+    key = recipe_card_cache_key(recipe_id)
+    recipe = cache.get(key)
+    if recipe is None:
+        recipe = Recipe.objects.using(DEFAULT_DB_ALIAS).only(
+            'id', 'name', 'image', 'cooking_time'
+        ).get(id=recipe_id)
+        cache.set(key, recipe, RECIPE_CARD_CACHE_TIMEOUT)
+    return recipe
+
+
+def database_sync_to_async(func):
+    """
+    Выполняет синхронный код с ORM из async-представления в пуле потоков.
+
+    В Django 3.2 под ASGI все вызовы sync_to_async(thread_sensitive=True)
+    идут в один общий поток, поэтому для параллельного чтения используется
+    thread_sensitive=False. Соединения с базой в потоках пула закрываются
+    до и после вызова, как это делает обработчик запроса.
+    С ASYNC_DB_THREAD_SENSITIVE=True (так в тестах) код выполняется
+    в общем потоке на соединении запроса и видит его транзакцию.
+    """
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    pooled = sync_to_async(inner, thread_sensitive=False)
+    shared = sync_to_async(func, thread_sensitive=True)
+
+    @wraps(func)
+    async def call(*args, **kwargs):
+        if settings.ASYNC_DB_THREAD_SENSITIVE:
+            return await shared(*args, **kwargs)
+        return await pooled(*args, **kwargs)
+    return call
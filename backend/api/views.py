@@ -1,17 +1,36 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.http import FileResponse
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
-from django.urls import reverse
-from django_filters.rest_framework import DjangoFilterBackend
 from djoser import views
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    AllowAny,
+    IsAuthenticated
+)
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomPageNumberPaginator
+from api.catalog import ingredient_catalog, tag_catalog
+from api.filters import RecipeFilter
+from api.pagination import (
+    CustomPageNumberPaginator,
+    KeysetCursorPaginator,
+    MergedCursorPaginator
+)
 from api.permissions import AdminPermission, UserAnonPermission
+from api.recipe_cache import recipe_cache
+from api.renderers import (
+    FormatParamNegotiation,
+    ShoppingListCSVRenderer,
+    ShoppingListPDFRenderer,
+    ShoppingListTextRenderer
+)
+from api.search import ingredient_index
+from api.similarity import similarity_index
 from api.serializers import (
     AvatarSerializer,
     IngredientSerializer,
@@ -25,50 +44,99 @@ from api.serializers import (
 from api import utiles
 from foodgram.constants import (
     DEFAULT_PAGINATOR_LIMIT,
-    ACTION_LIST_USER_VIEWSET
+    ACTION_LIST_USER_VIEWSET,
+    SAFE_READ_METHODS,
+    SIMILAR_RECIPES_LIMIT,
+    SIMILAR_RECIPES_MAX_LIMIT
 )
-from recipes.models import (Ingredient, Recipe, ShortLink, Tag)
+from foodgram.db_router import choose_read_alias, read_alias
+from recipes.models import (Ingredient, Recipe, Tag)
+from recipes.timeline import feed_sources, unfollow_author
 
 User = get_user_model()
 
 
+class ReplicaReadMixin:
+    """
+    Читающие запросы вьюсета обслуживаются репликой, если пользователь
+    недавно ничего не записывал. Реплика выбирается после
+    аутентификации, поэтому токен всегда проверяется на primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self.read_alias_token = read_alias.set(
+                choose_read_alias(request.user)
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'read_alias_token', None)
+        if token is not None:
+            read_alias.reset(token)
+            self.read_alias_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
 class RecipeActionMixin:
     """Миксин для добавления/удаления рецептов в корзину и избранное."""
 
+    counter_fields = {
+        'favorited': 'favorites_count',
+        'shopping_carted': 'cart_count',
+    }
+    cart_relation = 'shopping_carted'
+
     def recipe_action(self, request, pk=None, related_name=None):
-        """Общая логика для добавления/удаления в shopping_cart/favorite."""
-        user = request.user
-        target_recipe = get_object_or_404(Recipe, id=pk)
-        related_manager = getattr(target_recipe, related_name)
+        """
+        Общая логика для добавления/удаления в shopping_cart/favorite.
+        Запись делается одним INSERT ... ON CONFLICT DO NOTHING или
+        DELETE, а ответ определяется числом затронутых строк.
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        through = getattr(Recipe, related_name).through
+        counter_field = self.counter_fields[related_name]
         if request.method == 'POST':
-            if related_manager.filter(id=user.id).exists():
+            with transaction.atomic():
+                added = utiles.add_recipe_relation(through, pk, request.user)
+                if added:
+                    utiles.change_counter(Recipe, pk, counter_field, 1)
+                    if related_name == self.cart_relation:
+                        utiles.change_cart_totals(pk, 1, request.user.id)
+            if not added:
+                get_object_or_404(Recipe, id=pk)
                 return Response(
                     {'error': 'Рецепт уже добавлен.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            related_manager.add(user)
             return Response(
                 RecipeUserSerializer(
-                    target_recipe, context={'request': request}
+                    utiles.get_recipe_card(pk), context={'request': request}
                 ).data,
                 status=status.HTTP_201_CREATED
             )
         elif request.method == 'DELETE':
-            if not related_manager.filter(id=user.id).exists():
+            with transaction.atomic():
+                if related_name == self.cart_relation:
+                    utiles.change_cart_totals(pk, -1, request.user.id)
+                removed, _ = through.objects.filter(
+                    recipe_id=pk, user_id=request.user.id
+                ).delete()
+                if removed:
+                    utiles.change_counter(Recipe, pk, counter_field, -1)
+            if not removed:
+                get_object_or_404(Recipe, id=pk)
                 return Response(
                     {'error': 'Рецепта нет в списке.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            related_manager.remove(user)
-            return Response(
-                RecipeUserSerializer(
-                    target_recipe, context={'request': request}
-                ).data,
-                status=status.HTTP_204_NO_CONTENT
-            )
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet, RecipeActionMixin):
+class RecipeViewSet(
+    ReplicaReadMixin, viewsets.ModelViewSet, RecipeActionMixin
+):
     """Основной вьюсет для обработки действий с рецептами."""
 
     queryset = Recipe.objects.all()
@@ -78,6 +146,50 @@ class RecipeViewSet(viewsets.ModelViewSet, RecipeActionMixin):
     pagination_class = CustomPageNumberPaginator
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        """
+        Параметр ?cursor= переключает ленту на keyset-пагинацию.
+        Поиск сортирует по релевантности, поэтому с ?search= остаётся
+        постраничная пагинация.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if (
+                KeysetCursorPaginator.cursor_query_param in params
+                and not params.get('search')
+            ):
+                self._paginator = KeysetCursorPaginator()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve']:
+            return Recipe.objects.with_flags(self.request.user).only(
+                'id', 'author_id', 'created_at'
+            )
+        return super().get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        """Страница собирается из закешированных представлений."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(recipe_cache.render(request, list(queryset)))
+        return self.get_paginated_response(
+            recipe_cache.render(request, page)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(recipe_cache.render(request, [self.get_object()])[0])
+
+    def get_read_instance(self, recipe):
+        """Перечитывает рецепт с аннотациями для полного представления."""
+        return Recipe.objects.with_user_flags(self.request.user).get(
+            pk=recipe.pk
+        )
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeWriteSerializer
@@ -88,7 +200,7 @@ class RecipeViewSet(viewsets.ModelViewSet, RecipeActionMixin):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        recipe = serializer.instance
+        recipe = self.get_read_instance(serializer.instance)
         return Response(
             RecipeReadSerializer(recipe, context={'request': request}).data,
             status=status.HTTP_201_CREATED
@@ -103,11 +215,17 @@ class RecipeViewSet(viewsets.ModelViewSet, RecipeActionMixin):
         )
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        instance = self.get_read_instance(instance)
         return Response(
             RecipeReadSerializer(instance, context={'request': request}).data,
             status=status.HTTP_200_OK
         )
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        utiles.change_counter(User, instance.author_id, 'recipes_count', -1)
+        instance.delete()
+
     @action(detail=True, methods=['post', 'delete'], url_path='shopping_cart')
     def shopping_cart(self, request, pk=None):
         """Добавление рецепта в корзину."""
@@ -122,33 +240,87 @@ class RecipeViewSet(viewsets.ModelViewSet, RecipeActionMixin):
         detail=False,
         methods=['get'],
         url_path='download_shopping_cart',
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        content_negotiation_class=FormatParamNegotiation,
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListPDFRenderer,
+        ]
     )
     def get_shopping_cart_file(self, request):
-        """Метод получения файла со списком покупок."""
-        user = request.user
-        file = utiles.create_shopping_list(user)
-        return FileResponse(
-            file, as_attachment=True, filename='shopping_list.txt'
+        """
+        Метод получения файла со списком покупок.
+        Формат выбирается параметром ?format=txt|csv|pdf, по умолчанию
+        txt; заголовок Accept не учитывается.
+        """
+        renderer = request.accepted_renderer
+        rows = utiles.create_shopping_list(request.user)
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=(
+                f'{renderer.media_type}; charset={renderer.charset}'
+                if renderer.charset else renderer.media_type
+            )
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов из подписок, новые сначала.
+        Пагинация только по курсору: ?cursor= и limit.
+        """
+        paginator = MergedCursorPaginator()
+        page = paginator.paginate_queryset(feed_sources(request.user), request)
+        recipes = Recipe.objects.with_flags(request.user).only(
+            'id', 'author_id', 'created_at'
+        ).in_bulk([key.pk for key in page])
+        return paginator.get_paginated_response(recipe_cache.render(
+            request, [recipes[key.pk] for key in page if key.pk in recipes]
+        ))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Рецепты с наиболее похожим набором ингредиентов.
+        Количество задаётся параметром ?limit=.
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        limit = utiles.parse_limit(
+            request.query_params.get('limit'),
+            SIMILAR_RECIPES_LIMIT,
+            SIMILAR_RECIPES_MAX_LIMIT
+        )
+        similar = similarity_index.similar(int(pk), limit)
+        if similar is None:
+            raise Http404
+        recipes = Recipe.objects.with_flags(request.user).only(
+            'id', 'author_id', 'created_at'
+        ).in_bulk([recipe_id for recipe_id, _ in similar])
+        return Response(recipe_cache.render(request, [
+            recipes[recipe_id] for recipe_id, _ in similar
+            if recipe_id in recipes
+        ]))
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         """Метод получения короткой ссылки на рецепт."""
         recipe = get_object_or_404(Recipe, id=pk)
         base_url = utiles.get_base_url(request)
-        original_url = request.build_absolute_uri(
-            reverse('recipe-detail', kwargs={'pk': recipe.id})
-        )
-        shortlink, created = ShortLink.objects.get_or_create(
-            original_recipe_id=recipe.id,
-            short_code=utiles.generate_short_code_from_url(original_url)
-        )
-        short_url = f'{base_url}/s/{shortlink.short_code}'
+        short_url = f'{base_url}/s/{utiles.generate_short_code(recipe.id)}'
         return Response({'short-link': short_url})
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра тегов."""
 
     queryset = Tag.objects.all()
@@ -158,8 +330,23 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     ]
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return tag_catalog.response(request)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+def search_ingredients(request):
+    """Поиск по названию обслуживается индексом в памяти."""
+    name = request.GET.get('name')
+    if name is None:
+        return ingredient_catalog.response(request)
+    limit = utiles.parse_limit(request.GET.get('limit'))
+    return HttpResponse(
+        JSONRenderer().render(ingredient_index.search(name, limit)),
+        content_type='application/json'
+    )
+
+
+class IngredientViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра ингридиентов."""
 
     queryset = Ingredient.objects.all()
@@ -167,35 +354,108 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [
         UserAnonPermission | AdminPermission
     ]
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return search_ingredients(request)
 
-def short_link_redirect(request, short_code):
+
+async def short_link_redirect(request, short_code):
     """
     Перенаправление с короткой ссылки на оригинальный URL.
     """
-    short_link = get_object_or_404(ShortLink, short_code=short_code)
-    return redirect(
-        f'https://{request.get_host()}/recipes/{short_link.original_recipe_id}'
+    recipe_id = await utiles.database_sync_to_async(
+        utiles.resolve_short_code
+    )(short_code)
+    return redirect(f'https://{request.get_host()}/recipes/{recipe_id}')
+
+
+def async_read_view(view, read=None):
+    """
+    Async-представление для горячих адресов под ASGI.
+
+    GET и HEAD обслуживает корутина read, а если её нет — синхронное
+    представление view в пуле потоков, так что медленный клиент не
+    занимает поток. Остальные методы уходят во view как обычно.
+    """
+    if read is None:
+        read = utiles.database_sync_to_async(view)
+    write = sync_to_async(view)
+
+    async def dispatch(request, *args, **kwargs):
+        if request.method in SAFE_READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    dispatch.csrf_exempt = True
+    return dispatch
+
+
+async def read_tag_catalog(request):
+    """Справочник тегов публичен и отдаётся из кеша без DRF."""
+    return await utiles.database_sync_to_async(tag_catalog.response)(
+        request
     )
 
 
-class ListUserViewSet(views.UserViewSet):
+async def read_ingredient_catalog(request):
+    """Справочник ингредиентов и поиск по нему без DRF."""
+    return await utiles.database_sync_to_async(search_ingredients)(request)
+
+
+recipe_detail = async_read_view(RecipeViewSet.as_view(
+    {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    },
+    basename='recipe',
+    detail=True,
+))
+tag_list = async_read_view(
+    TagViewSet.as_view({'get': 'list'}, basename='tag', detail=False),
+    read_tag_catalog,
+)
+ingredient_list = async_read_view(
+    IngredientViewSet.as_view(
+        {'get': 'list'}, basename='ingredient', detail=False
+    ),
+    read_ingredient_catalog,
+)
+
+
+class ListUserViewSet(ReplicaReadMixin, views.UserViewSet):
 
     def get_queryset(self):
         """Возвращаем всех пользователей, если запрашивается список"""
         return User.objects.all()
 
 
-class CustomUserViewSet(views.UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, views.UserViewSet):
 
     def get_permissions(self):
         if self.action in ACTION_LIST_USER_VIEWSET:
             return [IsAuthenticated()]
         return [AllowAny()]
 
+    def get_recipes_limit(self):
+        """Без recipes_limit — DEFAULT_PAGINATOR_LIMIT, с неверным — все."""
+        return utiles.parse_limit(
+            self.request.query_params.get(
+                'recipes_limit', DEFAULT_PAGINATOR_LIMIT
+            )
+        )
+
+    def serialize_subscriptions(self, authors):
+        """Сериализует авторов с ограниченным списком их рецептов."""
+        authors = utiles.attach_recipes_window(
+            authors, self.get_recipes_limit()
+        )
+        return SubscribeUserSerializer(
+            authors, context={'request': self.request}, many=True
+        ).data
+
     @action(
         detail=False,
         methods=['get'],
@@ -203,27 +463,14 @@ class CustomUserViewSet(views.UserViewSet):
     )
     def subscriptions(self, request):
         """Получить список всех подписок пользователя с лимитом на рецепты"""
-        subscriptions = request.user.subscriptions.all()
+        subscriptions = (
+            request.user.subscriptions.order_by('id')
+        )
         paginator = CustomPageNumberPaginator()
-        paginator.default_limit = DEFAULT_PAGINATOR_LIMIT
         result_page = paginator.paginate_queryset(subscriptions, request)
-        recipes_limit = int(
-            request.query_params.get('recipes_limit', DEFAULT_PAGINATOR_LIMIT)
+        return paginator.get_paginated_response(
+            self.serialize_subscriptions(result_page)
         )
-        users_data = []
-        for user in result_page:
-            user_data = SubscribeUserSerializer(
-                user, context={'request': request}
-            ).data
-            recipes = user.recipes.all()
-            recipe_paginator = CustomPageNumberPaginator()
-            recipe_paginator.default_limit = recipes_limit
-            recipe_page = recipe_paginator.paginate_queryset(recipes, request)
-            user_data['recipes'] = RecipeUserSerializer(
-                recipe_page, context={'request': request}, many=True
-            ).data
-            users_data.append(user_data)
-        return paginator.get_paginated_response(users_data)
 
     @action(
         detail=True,
@@ -231,7 +478,6 @@ class CustomUserViewSet(views.UserViewSet):
         permission_classes=[IsAuthenticated]
     )
     def subscribe(self, request, id=None):
-        user = request.user
         data = {'target_user_id': id}
         serializer = SubscriptionSerializer(
             data=data,
@@ -239,20 +485,10 @@ class CustomUserViewSet(views.UserViewSet):
         )
         serializer.is_valid(raise_exception=True)
         target_user = serializer.save()
-        recipes_limit = int(
-            request.query_params.get('recipes_limit', DEFAULT_PAGINATOR_LIMIT)
+        return Response(
+            self.serialize_subscriptions([target_user])[0],
+            status=status.HTTP_201_CREATED
         )
-        user_data = SubscribeUserSerializer(
-            user, context={'request': request}
-        ).data
-        recipes = target_user.recipes.all()
-        paginator = CustomPageNumberPaginator()
-        paginator.default_limit = recipes_limit
-        recipe_page = paginator.paginate_queryset(recipes, request)
-        user_data['recipes'] = RecipeUserSerializer(
-            recipe_page, context={'request': request}, many=True
-        ).data
-        return Response(user_data, status=status.HTTP_201_CREATED)
 
     @action(
         detail=True,
@@ -268,7 +504,13 @@ class CustomUserViewSet(views.UserViewSet):
                 {'error': 'Вы не подписаны'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        user.subscriptions.remove(target_user)
+        with transaction.atomic():
+            user.subscriptions.remove(target_user)
+            utiles.change_counter(
+                User, target_user.id, 'subscribers_count', -1
+            )
+            unfollow_author(user.id, target_user.id)
+        utiles.invalidate_subscription_ids(request)
         return Response(
             {'detail': 'Вы отписались!'},
             status=status.HTTP_204_NO_CONTENT
@@ -8,3 +8,64 @@ ACTION_LIST_USER_VIEWSET = [
 ]
 MIN_VALUE = 1
 MAX_VALUE = 320000
+INGREDIENT_INDEX_TTL = 300
+NGRAM_SIZE = 3
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 1000
+IMPORT_READ_SIZE = 64 * 1024
+SHORT_LINK_CACHE_SIZE = 10000
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_SPOOL_SIZE = 1024 * 1024
+IMAGE_MAX_PIXELS = 25 * 1000 * 1000
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+IMAGE_VARIANTS = {'thumbnail': (400, 300), 'webp': None}
+IMAGE_QUALITY = 90
+WEBP_QUALITY = 80
+SUBSCRIPTIONS_CACHE_TIMEOUT = 60
+SEARCH_CONFIG = 'russian'
+SEARCH_MAX_RESULTS = 1000
+RECIPE_CARD_CACHE_TIMEOUT = 60 * 60
+RECIPE_REPR_CACHE_TIMEOUT = 60 * 60
+CATALOG_CACHE_TIMEOUT = 10 * 60
+TIMELINE_SIZE = 200
+TIMELINE_FANOUT_LIMIT = 1000
+SIMILARITY_INDEX_TTL = 300
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_RECIPES_MAX_LIMIT = 50
+BENCHMARK_PASSWORD = 'benchmark-password'
+BENCHMARK_IMAGE_NAME = 'recipes/images/benchmark.png'
+BENCHMARK_TAGS = (
+    ('breakfast', 'Завтрак'), ('lunch', 'Обед'), ('dinner', 'Ужин'),
+)
+BENCHMARK_ROUNDS = 20
+BENCHMARK_WARMUP = 2
+BENCHMARK_QUERY_BUDGETS = {
+    'recipe_list': 2,
+    'recipe_list_anonymous': 2,
+    'recipe_list_cursor': 1,
+    'recipe_detail': 1,
+    'recipe_filter_tags': 2,
+    'recipe_filter_favorited': 2,
+    'recipe_search': 3,
+    'feed': 2,
+    'similar': 1,
+    'subscriptions': 4,
+    'download_shopping_cart': 1,
+    'get_link': 1,
+    'short_link_redirect': 1,
+    'ingredient_search': 1,
+    'tag_list': 1,
+}
+SQL_SLOWEST_COUNT = 3
+SQL_STATEMENT_PREVIEW = 300
+SQL_WARN_QUERIES = 20
+SQL_WARN_DB_MS = 200
+SQL_REPEAT_THRESHOLD = 5
+SAFE_READ_METHODS = ('GET', 'HEAD')
+REPLICA_STICKY_SECONDS = 10
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_LOCAL_TTL = 10
+AUTH_TOKEN_CACHE_TTL = 5 * 60
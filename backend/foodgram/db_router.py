@@ -0,0 +1,56 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+read_alias = ContextVar('read_alias', default=None)
+
+
+def sticky_cache_key(user_id):
+    return f'replica_sticky:{user_id}'
+
+
+def stick_to_primary(user_id):
+    """После записи чтения пользователя какое-то время идут в primary."""
+    cache.set(
+        sticky_cache_key(user_id), True, settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def choose_read_alias(user):
+    """Реплика для чтения или None, если читать нужно из primary."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user.is_authenticated and cache.get(sticky_cache_key(user.id)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    """Отправляет чтения в реплику текущего запроса, запись — в primary."""
+
+    # Только что выданный токен не должен потеряться из-за отставания.
+    primary_only = {'authtoken', 'sessions'}
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Связанные объекты читаются из базы самого объекта.
+            return instance._state.db
+        alias = read_alias.get()
+        if alias is None or model._meta.app_label in self.primary_only:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
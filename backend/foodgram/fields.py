@@ -1,25 +1,39 @@
-import base64
-import imghdr
 import uuid
 
-from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from foodgram import images
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
-        """Декодирует base64-строку и сохраняет как файл."""
+        """
+        Декодирует base64-строку, проверяет изображение Pillow
+        и возвращает файл без метаданных.
+        """
         if isinstance(data, str) and data.startswith('data:image'):
             try:
-                format, imgstr = data.split(';base64,')
-                ext = format.split('/')[-1]
-                img_data = base64.b64decode(imgstr)
-                if not ext or ext not in ['jpeg', 'jpg', 'png']:
-                    ext = imghdr.what(None, h=img_data) or 'png'
-                filename = f'{uuid.uuid4()}.{ext}'
-                return ContentFile(img_data, name=filename)
-            except Exception as e:
+                _, imgstr = data.split(';base64,')
+                return images.clean_image(
+                    images.decode_base64(imgstr), uuid.uuid4()
+                )
+            except (ValueError, images.ImageProcessingError) as e:
                 raise serializers.ValidationError(
                     f'Ошибка декодирования изображения: {e}'
                 )
         return super().to_internal_value(data)
+
+
+class ImageVariantField(serializers.ReadOnlyField):
+    """Абсолютная ссылка на вариант изображения (миниатюра, WebP)."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = value.variant_url(self.variant)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,151 @@
+import base64
+import binascii
+import io
+import os
+import tempfile
+import warnings
+
+from django.core.files.base import ContentFile
+from django.db import models
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from foodgram.constants import (
+    BASE64_CHUNK_SIZE,
+    IMAGE_FORMATS,
+    IMAGE_MAX_PIXELS,
+    IMAGE_QUALITY,
+    IMAGE_SPOOL_SIZE,
+    IMAGE_VARIANTS,
+    WEBP_QUALITY
+)
+
+
+class ImageProcessingError(ValueError):
+    """Изображение не удалось декодировать или проверить."""
+
+
+def decode_base64(data):
+    """
+    Декодирует base64 кусками во временный файл, чтобы не держать
+    в памяти вторую полную копию изображения.
+    """
+    data = ''.join(data.split())
+    spool = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+    for start in range(0, len(data), BASE64_CHUNK_SIZE):
+        try:
+            spool.write(base64.b64decode(
+                data[start:start + BASE64_CHUNK_SIZE], validate=True
+            ))
+        except binascii.Error as error:
+            raise ImageProcessingError(error)
+    spool.seek(0)
+    return spool
+
+
+def open_image(file):
+    """
+    Открывает и проверяет изображение Pillow. Размер в пикселях
+    проверяется по заголовку, до декодирования: слишком большие
+    изображения и «бомбы декомпрессии» отклоняются.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(file) as probe:
+                if probe.width * probe.height > IMAGE_MAX_PIXELS:
+                    raise ImageProcessingError(
+                        'изображение больше '
+                        f'{IMAGE_MAX_PIXELS} пикселей'
+                    )
+                probe.verify()
+            file.seek(0)
+            image = Image.open(file)
+            image.load()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ImageProcessingError('слишком большое изображение')
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ImageProcessingError('файл не является изображением')
+    if image.format not in IMAGE_FORMATS:
+        raise ImageProcessingError(
+            f'Неподдерживаемый формат {image.format}'
+        )
+    return image
+
+
+def encode(image, image_format, **options):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.info = {}
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def clean_image(file, name):
+    """
+    Проверяет изображение и пересохраняет его без метаданных
+    (EXIF, ICC, комментарии), учитывая ориентацию из EXIF.
+    """
+    image = open_image(file)
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    return ContentFile(
+        encode(image, image_format, quality=IMAGE_QUALITY),
+        name=f'{name}.{IMAGE_FORMATS[image_format]}'
+    )
+
+
+def variant_name(name, variant):
+    """Имя файла варианта изображения рядом с оригиналом."""
+    return f'{os.path.splitext(name)[0]}_{variant}.webp'
+
+
+def build_variants(file):
+    """Возвращает {вариант: байты WebP} для исходного изображения."""
+    image = ImageOps.exif_transpose(open_image(file))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image if size is None else ImageOps.fit(image, size)
+        variants[variant] = encode(resized, 'WEBP', quality=WEBP_QUALITY)
+    return variants
+
+
+class VariantImageFieldFile(models.fields.files.ImageFieldFile):
+    """Файл изображения, рядом с которым хранятся его WebP-варианты."""
+
+    def variant_url(self, variant):
+        return self.storage.url(variant_name(self.name, variant))
+
+    def save_variants(self, content=None):
+        if content is None:
+            self.open('rb')
+            try:
+                variants = build_variants(self.file)
+            finally:
+                self.close()
+        else:
+            content.seek(0)
+            variants = build_variants(content)
+        for variant, data in variants.items():
+            name = variant_name(self.name, variant)
+            if self.storage.exists(name):
+                self.storage.delete(name)
+            self.storage.save(name, ContentFile(data))
+
+    def save(self, name, content, save=True):
+        super().save(name, content, save)
+        self.save_variants(content)
+
+    def delete(self, save=True):
+        if self.name:
+            for variant in IMAGE_VARIANTS:
+                self.storage.delete(variant_name(self.name, variant))
+        super().delete(save)
+
+
+class VariantImageField(models.ImageField):
+    """ImageField, который при сохранении строит уменьшенные копии."""
+
+    attr_class = VariantImageFieldFile
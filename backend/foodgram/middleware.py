@@ -0,0 +1,169 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.constants import SQL_SLOWEST_COUNT, SQL_STATEMENT_PREVIEW
+from foodgram.db_router import stick_to_primary
+
+logger = logging.getLogger('foodgram.sql')
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+def query_shape(sql):
+    """
+    Форма запроса без параметров. Django передаёт SQL с плейсхолдерами,
+    остаётся только схлопнуть списки IN разной длины.
+    """
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """Собирает запросы всех подключений за время одного запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.statements.append((elapsed, sql))
+            self.shapes[query_shape(sql)] += 1
+
+    def slowest(self):
+        return sorted(self.statements, reverse=True)[:SQL_SLOWEST_COUNT]
+
+    def repeated(self, threshold):
+        """Одинаковые формы запросов, повторённые threshold раз и более."""
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обёртка всех соединений: передаёт запрос регистратору текущего
+    запроса. Контекст копируется в потоки пула sync_to_async, поэтому
+    учитываются и запросы async-представлений.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class SQLInstrumentationMiddleware:
+    """Считает SQL-запросы и время в базе для каждого запроса к API."""
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.SQL_INSTRUMENTATION_SAMPLE_RATE
+        self.warn_only = settings.SQL_INSTRUMENTATION_WARN_ONLY
+        self.warn_queries = settings.SQL_WARN_QUERIES
+        self.warn_db_ms = settings.SQL_WARN_DB_MS
+        self.repeat_threshold = settings.SQL_REPEAT_THRESHOLD
+        connection_created.connect(
+            install_query_recorder, dispatch_uid='install_query_recorder'
+        )
+        for connection in connections.all():
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+        repeated = recorder.repeated(self.repeat_threshold)
+        response['Server-Timing'] = ', '.join(filter(None, (
+            response.get('Server-Timing'),
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+            f'app;dur={total_ms - db_ms:.1f}',
+            f'nplusone;desc="{len(repeated)} shapes"' if repeated else None,
+        )))
+        exceeded = bool(repeated) or (
+            recorder.count > self.warn_queries or db_ms > self.warn_db_ms
+        )
+        if exceeded or not self.warn_only:
+            self.log(request, response, recorder, total_ms, db_ms, repeated,
+                     logging.WARNING if exceeded else logging.INFO)
+        return response
+
+    def log(self, request, response, recorder, total_ms, db_ms, repeated,
+            level):
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'slowest': [
+                {'ms': round(elapsed * 1000, 2),
+                 'sql': sql[:SQL_STATEMENT_PREVIEW]}
+                for elapsed, sql in recorder.slowest()
+            ],
+            'repeated': [
+                {'count': count, 'sql': shape[:SQL_STATEMENT_PREVIEW]}
+                for shape, count in repeated
+            ],
+        }, ensure_ascii=False))
+
+
+class PrimaryStickinessMiddleware(MiddlewareMixin):
+    """
+    После успешного изменяющего запроса закрепляет пользователя за
+    primary на REPLICA_STICKY_SECONDS, чтобы он сразу видел свои записи.
+    Включается, только если настроены реплики.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            stick_to_primary(user.id)
+        return response
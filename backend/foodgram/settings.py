@@ -1,6 +1,9 @@
 import os
+import sys
 from pathlib import Path
 
+from foodgram import constants
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'SECRET_KEY')
@@ -27,10 +30,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.middleware.SQLInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.middleware.PrimaryStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +71,34 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=host1,host2. Для локальной
+# проверки можно указать тот же хост, что и у primary.
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(
+    os.getenv('REPLICA_STICKY_SECONDS', constants.REPLICA_STICKY_SECONDS)
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -107,7 +140,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -131,3 +164,49 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny'],
     }
 }
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Чтения async-представлений идут в пул потоков со своими соединениями.
+# True — в общий поток на соединении запроса, как нужно тестам.
+ASYNC_DB_THREAD_SENSITIVE = (
+    os.getenv('ASYNC_DB_THREAD_SENSITIVE') == 'True'
+    or sys.argv[1:2] == ['test']
+)
+
+SQL_INSTRUMENTATION = (os.getenv('SQL_INSTRUMENTATION') == 'True')
+SQL_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('SQL_INSTRUMENTATION_SAMPLE_RATE', 1)
+)
+SQL_INSTRUMENTATION_WARN_ONLY = (
+    os.getenv('SQL_INSTRUMENTATION_WARN_ONLY') == 'True'
+)
+SQL_WARN_QUERIES = int(
+    os.getenv('SQL_WARN_QUERIES', constants.SQL_WARN_QUERIES)
+)
+SQL_WARN_DB_MS = float(os.getenv('SQL_WARN_DB_MS', constants.SQL_WARN_DB_MS))
+SQL_REPEAT_THRESHOLD = int(
+    os.getenv('SQL_REPEAT_THRESHOLD', constants.SQL_REPEAT_THRESHOLD)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.sql': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+AUTH_TOKEN_LOCAL_TTL = int(
+    os.getenv('AUTH_TOKEN_LOCAL_TTL', constants.AUTH_TOKEN_LOCAL_TTL)
+)
+AUTH_TOKEN_SHARED_CACHE = (os.getenv('AUTH_TOKEN_SHARED_CACHE') == 'True')
+AUTH_TOKEN_CACHE_TTL = int(
+    os.getenv('AUTH_TOKEN_CACHE_TTL', constants.AUTH_TOKEN_CACHE_TTL)
+)
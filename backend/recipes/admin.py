@@ -5,7 +5,7 @@ from recipes.models import Ingredient, Recipe, RecipeIngredient, ShortLink, Tag
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorites_count', 'cart_count')
     search_fields = ('author', 'name')
     list_filter = ('tags__name',)
 
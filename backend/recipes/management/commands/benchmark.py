@@ -0,0 +1,234 @@
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.utiles import generate_short_code
+from foodgram.constants import (
+    BENCHMARK_QUERY_BUDGETS,
+    BENCHMARK_ROUNDS,
+    BENCHMARK_WARMUP
+)
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def consume(response):
+    """Дочитывает потоковый ответ, чтобы замер включал генерацию тела."""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы во всех потоках, включая пул, в котором
+    async-представления выполняют ORM. Обёртка ставится на каждое
+    новое соединение и считает только между start() и stop().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        self._lock = threading.Lock()
+        connection_created.connect(self.attach, weak=False)
+        for alias_connection in connections.all():
+            self.attach(connection=alias_connection)
+
+    def attach(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.active:
+            with self._lock:
+                self.count += 1
+        return execute(sql, params, many, context)
+
+    def start(self):
+        self.count = 0
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        return self.count
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа и число SQL-запросов ключевых эндпоинтов '
+        'и сверяет их с бюджетами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=BENCHMARK_ROUNDS)
+        parser.add_argument('--warmup', type=int, default=BENCHMARK_WARMUP)
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument(
+            '--compare', help='JSON предыдущего прогона для сравнения'
+        )
+        parser.add_argument(
+            '--only', nargs='+', help='Запустить только указанные замеры'
+        )
+
+    def get_cases(self):
+        """Список (имя, клиент, URL) для замеров."""
+        user = (
+            User.objects
+            .filter(in_cart__isnull=False, subscriptions__isnull=False)
+            .order_by('id')
+            .first()
+        )
+        recipe = Recipe.objects.order_by('-id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if not all((user, recipe, tag, ingredient)):
+            raise CommandError(
+                'Нет данных для замеров: выполните generate_data.'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost'
+        ).lstrip('.')
+        anonymous = APIClient(HTTP_HOST=host)
+        client = APIClient(HTTP_HOST=host)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        word = recipe.name.split()[0]
+        return [
+            ('recipe_list', client, '/api/recipes/'),
+            ('recipe_list_anonymous', anonymous, '/api/recipes/'),
+            ('recipe_list_cursor', client, '/api/recipes/?cursor='),
+            ('recipe_detail', client, f'/api/recipes/{recipe.id}/'),
+            ('recipe_filter_tags', client,
+             f'/api/recipes/?tags={tag.slug}'),
+            ('recipe_filter_favorited', client,
+             '/api/recipes/?is_favorited=1'),
+            ('recipe_search', client, f'/api/recipes/?search={word}'),
+            ('feed', client, '/api/recipes/feed/'),
+            ('similar', client, f'/api/recipes/{recipe.id}/similar/'),
+            ('subscriptions', client,
+             '/api/users/subscriptions/?recipes_limit=3'),
+            ('download_shopping_cart', client,
+             '/api/recipes/download_shopping_cart/'),
+            ('get_link', client, f'/api/recipes/{recipe.id}/get-link/'),
+            ('short_link_redirect', anonymous,
+             f'/s/{generate_short_code(recipe.id)}/'),
+            ('ingredient_search', anonymous,
+             f'/api/ingredients/?name={ingredient.name[:3]}'),
+            ('tag_list', anonymous, '/api/tags/'),
+        ]
+
+    def measure(self, client, url, rounds, warmup):
+        for _ in range(warmup):
+            consume(client.get(url))
+        timings = []
+        queries = []
+        for _ in range(rounds):
+            self.counter.start()
+            started = time.perf_counter()
+            response = client.get(url)
+            consume(response)
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(self.counter.stop())
+        if response.status_code >= 400:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return {
+            'url': url,
+            'status': response.status_code,
+            'rounds': rounds,
+            'min_ms': min(timings),
+            'max_ms': max(timings),
+            'mean_ms': statistics.mean(timings),
+            'median_ms': statistics.median(timings),
+            'stddev_ms': (
+                statistics.stdev(timings) if len(timings) > 1 else 0.0
+            ),
+            'queries': max(queries),
+        }
+
+    def get_meta(self):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'rows': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+        }
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)['results']
+        self.stdout.write(f'Сравнение с {path}:')
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            ratio = result['median_ms'] / previous[name]['median_ms']
+            style = self.style.ERROR if ratio > 1.2 else self.style.SUCCESS
+            self.stdout.write(style(
+                f'  {name:<26} x{ratio:.2f} медианы, запросов '
+                f'{previous[name]["queries"]} -> {result["queries"]}'
+            ))
+
+    def handle(self, *args, **options):
+        settings.DEBUG = False
+        self.counter = QueryCounter()
+        results = {}
+        over_budget = []
+        for name, client, url in self.get_cases():
+            if options['only'] and name not in options['only']:
+                continue
+            result = self.measure(
+                client, url, options['rounds'], options['warmup']
+            )
+            result['budget'] = BENCHMARK_QUERY_BUDGETS.get(name)
+            results[name] = result
+            exceeded = (
+                result['budget'] is not None
+                and result['queries'] > result['budget']
+            )
+            if exceeded:
+                over_budget.append(name)
+            style = self.style.ERROR if exceeded else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{name:<26} медиана {result["median_ms"]:8.2f} мс, '
+                f'запросов {result["queries"]}/{result["budget"]}'
+            ))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {'meta': self.get_meta(), 'results': results},
+                    file, ensure_ascii=False, indent=2
+                )
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if over_budget:
+            raise CommandError(
+                'Превышен бюджет запросов: ' + ', '.join(over_budget)
+            )
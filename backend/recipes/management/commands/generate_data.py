@@ -0,0 +1,179 @@
+import io
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from foodgram.constants import (
+    BENCHMARK_IMAGE_NAME,
+    BENCHMARK_PASSWORD,
+    BENCHMARK_TAGS,
+    IMPORT_BATCH_SIZE
+)
+from foodgram.images import build_variants, variant_name
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'борщ', 'плов',
+    'омлет', 'блины', 'котлеты', 'паста', 'соус', 'торт', 'смузи',
+    'домашний', 'быстрый', 'острый', 'сливочный', 'летний', 'овощной',
+    'куриный', 'грибной', 'сырный', 'лёгкий', 'праздничный', 'пряный',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочных замеров: '
+        'пользователей, подписки, рецепты, избранное и корзины'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--subscriptions', type=int, default=20,
+                            help='Подписок на пользователя')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Рецептов в избранном у пользователя')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='Рецептов в корзине у пользователя')
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Ингредиентов в рецепте')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def bulk_create(self, model, objects):
+        return model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def create_users(self, count, rng):
+        password = make_password(BENCHMARK_PASSWORD)
+        prefix = f'bench{rng.randrange(10 ** 8)}'
+        self.bulk_create(User, [
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name='Пользователь',
+                last_name=str(number),
+                password=password,
+            )
+            for number in range(count)
+        ])
+        return list(
+            User.objects
+            .filter(username__startswith=f'{prefix}_')
+            .values_list('id', flat=True)
+        )
+
+    def create_recipes(self, count, user_ids, rng):
+        self.bulk_create(Recipe, [
+            Recipe(
+                author_id=rng.choice(user_ids),
+                name=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                text=' '.join(rng.choices(WORDS, k=40)),
+                cooking_time=rng.randint(5, 180),
+                image=BENCHMARK_IMAGE_NAME,
+            )
+            for _ in range(count)
+        ])
+        return list(
+            Recipe.objects
+            .filter(author_id__in=user_ids)
+            .values_list('id', flat=True)
+        )
+
+    def link_users(self, through, source_field, target_field,
+                   source_ids, target_ids, per_source, rng):
+        per_source = min(per_source, len(target_ids))
+        self.bulk_create(through, [
+            through(**{source_field: source, target_field: target})
+            for source in source_ids
+            for target in rng.sample(target_ids, per_source)
+            if source != target
+        ])
+
+    def ensure_image(self):
+        """Одна общая картинка с вариантами для всех рецептов."""
+        if default_storage.exists(BENCHMARK_IMAGE_NAME):
+            return
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'orange').save(buffer, 'PNG')
+        default_storage.save(
+            BENCHMARK_IMAGE_NAME, ContentFile(buffer.getvalue())
+        )
+        buffer.seek(0)
+        for variant, data in build_variants(buffer).items():
+            default_storage.save(
+                variant_name(BENCHMARK_IMAGE_NAME, variant), ContentFile(data)
+            )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        if len(ingredient_ids) < options['ingredients']:
+            raise CommandError(
+                'Недостаточно ингредиентов: сначала выполните '
+                'import_ingredients.'
+            )
+        self.ensure_image()
+        with transaction.atomic():
+            self.bulk_create(Tag, [
+                Tag(name=name, slug=slug) for slug, name in BENCHMARK_TAGS
+            ])
+            tag_ids = list(Tag.objects.values_list('id', flat=True))
+            user_ids = self.create_users(options['users'], rng)
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, rng
+            )
+            self.bulk_create(Recipe.tags.through, [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in rng.sample(tag_ids, rng.randint(1, 2))
+            ])
+            self.bulk_create(RecipeIngredient, [
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rng.sample(
+                    ingredient_ids, options['ingredients']
+                )
+            ])
+            self.link_users(
+                User.subscriptions.through, 'from_user_id', 'to_user_id',
+                user_ids, user_ids, options['subscriptions'], rng
+            )
+            self.link_users(
+                Recipe.favorited.through, 'user_id', 'recipe_id',
+                user_ids, recipe_ids, options['favorites'], rng
+            )
+            self.link_users(
+                Recipe.shopping_carted.through, 'user_id', 'recipe_id',
+                user_ids, recipe_ids, options['cart'], rng
+            )
+        call_command('recount', stdout=io.StringIO())
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        call_command('rebuild_cart_totals', stdout=io.StringIO())
+        call_command('rebuild_timelines', stdout=io.StringIO())
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)} '
+            f'за {time.perf_counter() - started:.1f} с. '
+            f'Пароль пользователей: {BENCHMARK_PASSWORD}'
+        ))
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from foodgram.images import ImageProcessingError
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры и WebP-варианты для уже загруженных изображений'
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        for queryset, field in (
+            (Recipe.objects.only('image'), 'image'),
+            (User.objects.exclude(avatar='').only('avatar'), 'avatar'),
+        ):
+            for instance in queryset.iterator():
+                image = getattr(instance, field)
+                if not image:
+                    continue
+                try:
+                    image.save_variants()
+                    processed += 1
+                except (OSError, ImageProcessingError) as error:
+                    failed += 1
+                    self.stderr.write(f'{image.name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибками: {failed}'
+        ))
@@ -1,20 +1,109 @@
+import csv
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.constants import IMPORT_BATCH_SIZE, IMPORT_READ_SIZE
 from recipes.models import Ingredient
+from recipes.signals import ingredients_imported
+
+
+def iter_json_array(file, read_size=IMPORT_READ_SIZE):
+    """Построчно разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(read_size)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Файл JSON обрывается.')
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {
+    '.json': iter_json_array,
+    '.csv': iter_csv,
+}
 
 
 class Command(BaseCommand):
-    help = 'Загружает данные о продуктах из JSON файла в базу данных'
-
-    def handle(self, *args, **kwargs):
-        json_file_path = 'ingredients.json'
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            products_data = json.load(file)
-        for product in products_data:
-            Ingredient.objects.create(
-                name=product['name'],
-                measurement_unit=product['measurement_unit']
-            )
-
-        self.stdout.write(self.style.SUCCESS('Данные успешно загружены!'))
+    help = 'Загружает данные о продуктах из JSON или CSV файлов в базу данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            nargs='+',
+            default=['ingredients.json'],
+            help='Пути к файлам .json или .csv',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Размер пачки для bulk_create',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for path in map(Path, options['path']):
+            reader = READERS.get(path.suffix.lower())
+            if reader is None:
+                raise CommandError(f'Неизвестный формат файла: {path}')
+            started = time.perf_counter()
+            count_before = Ingredient.objects.count()
+            processed = 0
+            with open(path, 'r', encoding='utf-8') as file:
+                rows = reader(file)
+                with transaction.atomic():
+                    while True:
+                        batch = [
+                            Ingredient(name=name, measurement_unit=unit)
+                            for name, unit in islice(rows, batch_size)
+                        ]
+                        if not batch:
+                            break
+                        Ingredient.objects.bulk_create(
+                            batch, ignore_conflicts=True
+                        )
+                        processed += len(batch)
+            elapsed = time.perf_counter() - started
+            created = Ingredient.objects.count() - count_before
+            if created:
+                ingredients_imported.send(sender=self.__class__)
+            self.stdout.write(self.style.SUCCESS(
+                f'{path}: обработано {processed}, добавлено {created}, '
+                f'{processed / elapsed if elapsed else processed:.0f} '
+                'строк/с'
+            ))
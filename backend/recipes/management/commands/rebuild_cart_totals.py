@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.utiles import rebuild_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает суммы ингредиентов в корзинах пользователей'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rows = rebuild_cart_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано строк списков покупок: {rows}'
+        ))
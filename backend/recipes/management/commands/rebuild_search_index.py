@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import ensure_search_schema, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс рецептов'
+
+    def handle(self, *args, **options):
+        ensure_search_schema()
+        count = 0
+        with transaction.atomic():
+            for recipe in Recipe.objects.only('id', 'name', 'text').iterator():
+                update_search_index(recipe)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {count}'
+        ))
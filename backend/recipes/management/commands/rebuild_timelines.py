@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.timeline import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты рецептов из подписок пользователей'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rows = rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {rows}'
+        ))
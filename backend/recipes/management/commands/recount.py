@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с числом строк queryset, связанных с внешним объектом."""
+    return Coalesce(
+        Subquery(
+            queryset
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('*'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики рецептов и подписок'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        users = User.objects.update(
+            recipes_count=count_subquery(Recipe.objects.all(), 'author'),
+            subscribers_count=count_subquery(
+                User.subscriptions.through.objects.all(), 'to_user'
+            ),
+        )
+        recipes = Recipe.objects.update(
+            favorites_count=count_subquery(
+                Recipe.favorited.through.objects.all(), 'recipe'
+            ),
+            cart_count=count_subquery(
+                Recipe.shopping_carted.through.objects.all(), 'recipe'
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, рецептов: {recipes}'
+        ))
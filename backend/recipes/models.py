@@ -1,14 +1,17 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Value
 
 from foodgram.constants import MAX_LENGTH, MAX_TEXT_LENGHT, LENGTH_SHORT_LINK
+from foodgram.images import VariantImageField
 
 User = get_user_model()
 
 
 class Tag(models.Model):
     name = models.CharField('Тэг', max_length=MAX_LENGTH)
-    slug = models.SlugField()
+    slug = models.SlugField(unique=True)
 
     def __str__(self):
         return self.name
@@ -20,10 +23,59 @@ class Ingredient(models.Model):
         'Единицы измерения', max_length=MAX_LENGTH
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit'
+            )
+        ]
+
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_flags(self, user):
+        """Аннотирует рецепты флагами избранного и корзины пользователя."""
+        if user.is_authenticated:
+            is_favorited = Exists(
+                Recipe.favorited.through.objects.filter(
+                    recipe=OuterRef('pk'), user=user
+                )
+            )
+            is_in_shopping_cart = Exists(
+                Recipe.shopping_carted.through.objects.filter(
+                    recipe=OuterRef('pk'), user=user
+                )
+            )
+        else:
+            is_favorited = is_in_shopping_cart = Value(
+                False, output_field=models.BooleanField()
+            )
+        return self.annotate(
+            is_favorited=is_favorited,
+            is_in_shopping_cart=is_in_shopping_cart,
+        )
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами текущего пользователя и подгружает
+        всё, что нужно для RecipeReadSerializer, фиксированным числом
+        запросов.
+        """
+        return self.with_flags(user).defer(
+            'search_vector'
+        ).select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -33,7 +85,7 @@ class Recipe(models.Model):
         max_length=MAX_LENGTH,
         verbose_name='Название рецепта'
     )
-    image = models.ImageField()
+    image = VariantImageField()
     text = models.TextField(
         verbose_name='Описание',
         max_length=MAX_TEXT_LENGHT
@@ -48,10 +100,24 @@ class Recipe(models.Model):
     )
     favorited = models.ManyToManyField(User, related_name='favorite')
     shopping_carted = models.ManyToManyField(User, related_name='in_cart')
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'], name='recipe_created_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -77,6 +143,63 @@ class RecipeIngredient(models.Model):
         return f'{self.recipe.name} - {self.ingredient.name}'
 
 
+class CartIngredientTotal(models.Model):
+    """
+    Сумма ингредиента по всем рецептам в корзине пользователя.
+    Поддерживается при изменении корзины и состава рецептов,
+    пересчитывается командой rebuild_cart_totals.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='cart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='cart_totals'
+    )
+    amount = models.BigIntegerField('Количество')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'], name='unique_cart_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient.name}: {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписчика его автора. Строки раскладываются при
+    создании рецепта и подписке, created_at копируется из рецепта.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-recipe'],
+                name='timeline_user_created_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe_id}'
+
+
 class ShortLink(models.Model):
     short_code = models.CharField(
         max_length=LENGTH_SHORT_LINK,
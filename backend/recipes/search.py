@@ -0,0 +1,123 @@
+"""
+Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+На PostgreSQL документ хранится в Recipe.search_vector с GIN-индексом,
+на SQLite — в виртуальной таблице FTS5. Индекс обновляется
+update_search_index() после коммита любого изменения рецепта, его
+ингредиентов или названия ингредиента (см. recipes.signals).
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection
+from django.db.models import Case, F, Q, TextField, Value, When
+
+from foodgram.constants import SEARCH_CONFIG, SEARCH_MAX_RESULTS
+
+FTS_TABLE = 'recipes_recipe_fts'
+GIN_INDEX = 'recipe_search_vector_gin'
+WORD_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    """FTS5 не считает ё и е одной буквой, приводим к е сами."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def ensure_search_schema(using_connection=connection):
+    """Создаёт GIN-индекс или таблицу FTS5, если их ещё нет."""
+    vendor = using_connection.vendor
+    with using_connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {GIN_INDEX} '
+                'ON recipes_recipe USING gin (search_vector)'
+            )
+        elif vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                'USING fts5(name, text, ingredients, '
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+
+def ingredient_names(recipe):
+    return ' '.join(
+        recipe.recipe_ingredient.values_list('ingredient__name', flat=True)
+    )
+
+
+def update_search_index(recipe):
+    """Пересчитывает поисковый документ рецепта."""
+    ingredients = ingredient_names(recipe)
+    if connection.vendor == 'postgresql':
+        recipe.__class__.objects.filter(pk=recipe.pk).update(
+            search_vector=(
+                SearchVector(
+                    Value(recipe.name, output_field=TextField()),
+                    weight='A', config=SEARCH_CONFIG
+                )
+                + SearchVector(
+                    Value(ingredients, output_field=TextField()),
+                    weight='B', config=SEARCH_CONFIG
+                )
+                + SearchVector(
+                    Value(recipe.text, output_field=TextField()),
+                    weight='C', config=SEARCH_CONFIG
+                )
+            )
+        )
+    elif connection.vendor == 'sqlite':
+        document = [fold(recipe.name), fold(recipe.text), fold(ingredients)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} '
+                '(rowid, name, text, ingredients) VALUES (%s, %s, %s, %s)',
+                [recipe.pk, *document]
+            )
+
+
+def remove_from_search_index(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def search_recipes(queryset, value):
+    """Фильтрует рецепты по запросу и сортирует по релевантности."""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-created_at')
+    if connection.vendor != 'sqlite':
+        condition = Q()
+        for word in WORD_RE.findall(value):
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return queryset.filter(condition)
+    words = WORD_RE.findall(fold(value))
+    if not words:
+        return queryset.none()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0, 5.0) LIMIT %s',
+            [' '.join(f'"{word}"*' for word in words), SEARCH_MAX_RESULTS]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return queryset.none()
+    return queryset.filter(id__in=ids).order_by(
+        Case(*(When(id=pk, then=position) for position, pk in enumerate(ids)))
+    )
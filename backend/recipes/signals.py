@@ -0,0 +1,54 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.search import (
+    ensure_search_schema,
+    remove_from_search_index,
+    update_search_index
+)
+
+# Отправляется после массовой загрузки ингредиентов, которая
+# не вызывает post_save для отдельных объектов.
+ingredients_imported = Signal()
+
+
+def create_search_schema(using, **kwargs):
+    """Подключается к post_migrate в RecipesConfig.ready."""
+    ensure_search_schema(connections[using])
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_search_document(instance, **kwargs):
+    remove_from_search_index(instance.pk)
+
+
+def refresh_search_documents(recipes):
+    """
+    Пересчитывает документы рецептов после коммита: сериализатор
+    и админка меняют ингредиенты уже после сохранения рецепта.
+    """
+    def refresh():
+        for recipe in recipes.only('id', 'name', 'text'):
+            update_search_index(recipe)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, **kwargs):
+    refresh_search_documents(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def index_recipe_ingredients(instance, **kwargs):
+    refresh_search_documents(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_recipes(instance, created, **kwargs):
+    """Новое название ингредиента попадает в документы его рецептов."""
+    if not created:
+        refresh_search_documents(
+            Recipe.objects.filter(ingredients=instance).distinct()
+        )
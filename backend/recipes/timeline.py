@@ -0,0 +1,185 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Новый рецепт раскладывается в TimelineEntry каждого подписчика
+(fan-out-on-write), а лента подписчика обрезается до TIMELINE_SIZE
+последних записей. У авторов с числом подписчиков больше
+TIMELINE_FANOUT_LIMIT рецепты не раскладываются: лента подмешивает
+их при чтении (fan-out-on-read). Если автор пересёк порог в любую
+сторону, ленты выравниваются командой rebuild_timelines.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from foodgram.constants import TIMELINE_FANOUT_LIMIT, TIMELINE_SIZE
+from recipes.models import Recipe, TimelineEntry
+
+User = get_user_model()
+
+
+def timeline_tables():
+    quote = connection.ops.quote_name
+    return {
+        'timeline': quote(TimelineEntry._meta.db_table),
+        'recipes': quote(Recipe._meta.db_table),
+        'users': quote(User._meta.db_table),
+        'subscriptions': quote(User.subscriptions.through._meta.db_table),
+    }
+
+
+def trim_timelines(cursor, users_sql, params):
+    """Оставляет в лентах пользователей users_sql TIMELINE_SIZE записей."""
+    tables = timeline_tables()
+    cursor.execute(
+        f'DELETE FROM {tables["timeline"]} WHERE id IN ('
+        'SELECT id FROM ('
+        'SELECT id, ROW_NUMBER() OVER ('
+        'PARTITION BY user_id ORDER BY created_at DESC, recipe_id DESC'
+        f') AS position FROM {tables["timeline"]} '
+        f'WHERE user_id IN ({users_sql})'
+        ') AS ranked WHERE position > %s)',
+        [*params, TIMELINE_SIZE]
+    )
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    tables = timeline_tables()
+    followers = (
+        f'SELECT from_user_id FROM {tables["subscriptions"]} '
+        'WHERE to_user_id = %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tables["timeline"]} '
+            '(user_id, recipe_id, created_at) '
+            f'SELECT from_user_id, %s, %s FROM {tables["subscriptions"]} '
+            'WHERE to_user_id = %s AND ('
+            f'SELECT subscribers_count FROM {tables["users"]} '
+            'WHERE id = %s) <= %s '
+            'ON CONFLICT DO NOTHING',
+            [recipe.id, recipe.created_at, recipe.author_id,
+             recipe.author_id, TIMELINE_FANOUT_LIMIT]
+        )
+        if cursor.rowcount:
+            trim_timelines(cursor, followers, [recipe.author_id])
+
+
+def follow_author(user_id, author_id):
+    """Дополняет ленту нового подписчика последними рецептами автора."""
+    tables = timeline_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tables["timeline"]} '
+            '(user_id, recipe_id, created_at) '
+            f'SELECT %s, id, created_at FROM {tables["recipes"]} '
+            'WHERE author_id = %s AND ('
+            f'SELECT subscribers_count FROM {tables["users"]} '
+            'WHERE id = %s) <= %s '
+            'ORDER BY created_at DESC, id DESC LIMIT %s '
+            'ON CONFLICT DO NOTHING',
+            [user_id, author_id, author_id, TIMELINE_FANOUT_LIMIT,
+             TIMELINE_SIZE]
+        )
+        if cursor.rowcount:
+            trim_timelines(cursor, '%s', [user_id])
+
+
+def ranked_recipes(subscription_filter):
+    """
+    Рецепты разложенных авторов, пронумерованные в ленте каждого
+    подписчика от новых к старым. Параметры: TIMELINE_FANOUT_LIMIT и
+    параметры subscription_filter.
+    """
+    tables = timeline_tables()
+    return (
+        'SELECT subscription.from_user_id AS user_id, '
+        'recipe.id AS recipe_id, recipe.created_at AS created_at, '
+        'ROW_NUMBER() OVER ('
+        'PARTITION BY subscription.from_user_id '
+        'ORDER BY recipe.created_at DESC, recipe.id DESC'
+        ') AS position '
+        f'FROM {tables["subscriptions"]} AS subscription '
+        f'JOIN {tables["recipes"]} AS recipe '
+        'ON recipe.author_id = subscription.to_user_id '
+        f'JOIN {tables["users"]} AS author '
+        'ON author.id = subscription.to_user_id '
+        f'WHERE author.subscribers_count <= %s{subscription_filter}'
+    )
+
+
+def unfollow_author(user_id, author_id):
+    """
+    Убирает из ленты бывшего подписчика рецепты автора и дополняет её
+    до TIMELINE_SIZE рецептами остальных авторов, которые эти рецепты
+    вытеснили. Вызывается после удаления подписки.
+    """
+    tables = timeline_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tables["timeline"]} WHERE user_id = %s '
+            f'AND recipe_id IN (SELECT id FROM {tables["recipes"]} '
+            'WHERE author_id = %s)',
+            [user_id, author_id]
+        )
+        if not cursor.rowcount:
+            return
+        cursor.execute(
+            f'INSERT INTO {tables["timeline"]} '
+            '(user_id, recipe_id, created_at) '
+            'SELECT user_id, recipe_id, created_at FROM ('
+            + ranked_recipes(
+                ' AND subscription.from_user_id = %s AND NOT EXISTS ('
+                f'SELECT 1 FROM {tables["timeline"]} AS entry '
+                'WHERE entry.user_id = subscription.from_user_id '
+                'AND entry.recipe_id = recipe.id)'
+            )
+            + ') AS ranked WHERE position <= %s - ('
+            f'SELECT COUNT(*) FROM {tables["timeline"]} WHERE user_id = %s)',
+            [TIMELINE_FANOUT_LIMIT, user_id, TIMELINE_SIZE, user_id]
+        )
+
+
+def rebuild_timelines(user_id=None):
+    """
+    Собирает заново по текущим подпискам ленту пользователя user_id
+    или, если он не задан, все ленты.
+    """
+    tables = timeline_tables()
+    user_filter = '' if user_id is None else ' WHERE user_id = %s'
+    subscription_filter = (
+        '' if user_id is None else ' AND subscription.from_user_id = %s'
+    )
+    user_params = [] if user_id is None else [user_id]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tables["timeline"]}{user_filter}', user_params
+        )
+        cursor.execute(
+            f'INSERT INTO {tables["timeline"]} '
+            '(user_id, recipe_id, created_at) '
+            'SELECT user_id, recipe_id, created_at FROM ('
+            + ranked_recipes(subscription_filter)
+            + ') AS ranked WHERE position <= %s',
+            [TIMELINE_FANOUT_LIMIT, *user_params, TIMELINE_SIZE]
+        )
+        return cursor.rowcount
+
+
+def feed_sources(user):
+    """
+    Источники ленты для MergedCursorPaginator: разложенные записи,
+    которые обходятся по индексу (user, -created_at, -recipe), и рецепты
+    авторов, у которых слишком много подписчиков для раскладки.
+    """
+    return [
+        (TimelineEntry.objects.filter(user=user), 'recipe_id'),
+        (
+            Recipe.objects.filter(
+                author__in=user.subscriptions.filter(
+                    subscribers_count__gt=TIMELINE_FANOUT_LIMIT
+                )
+            ),
+            'id'
+        ),
+    ]
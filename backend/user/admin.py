@@ -5,4 +5,7 @@ from user.models import User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
+    list_display = (
+        'username', 'email', 'recipes_count', 'subscribers_count'
+    )
     search_fields = ('email', 'first_name')
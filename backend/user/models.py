@@ -2,19 +2,27 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from foodgram.constants import MAX_LENGTH
+from foodgram.images import VariantImageField
 
 
 class User(AbstractUser):
     email = models.EmailField(
         blank=False, null=False, unique=True, max_length=MAX_LENGTH
     )
-    avatar = models.ImageField()
+    avatar = VariantImageField()
     subscriptions = models.ManyToManyField(
         'self',
         symmetrical=False,
         related_name='subscribers',
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -0,0 +1,367 @@
+"""
+Нагрузочный прогон API по запросам postman-коллекции.
+
+Папки коллекции превращаются во взвешенные сценарии. Виртуальные
+пользователи параллельно выбирают сценарий по весу и выполняют его
+запросы по порядку. В конце печатается пропускная способность,
+p50/p95/p99 и доля ошибок по каждому эндпоинту.
+
+Переменные, которые в Postman выставляют JS-тесты (userId, firstRecipeId,
+userToken и т.д.), здесь заполняются при подготовке: регистрируются
+виртуальные пользователи, а id тегов, ингредиентов и рецептов берутся
+из API. Поэтому в базе должны быть теги, ингредиенты и рецепты, например
+после команд import_ingredients и generate_data.
+
+Пример:
+    python load_replay.py --base-url http://127.0.0.1:8000 \\
+        --concurrency 20 --duration 60 --output capacity.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+COLLECTION_PATH = Path(__file__).with_name('foodgram.postman_collection.json')
+VARIABLE_RE = re.compile(r'\{\{(\w+)\}\}')
+PASSWORD = 'LoadReplay-Pa$$word'
+PERCENTILES = (50, 95, 99)
+REQUEST_TIMEOUT = 30
+# Сценарии по умолчанию: только чтение, чтобы прогон можно было
+# повторять на одной и той же базе. Остальные папки включаются
+# явным --weight.
+DEFAULT_WEIGHTS = {
+    'recipes/get_recipes': 10,
+    'recipe_filters_for_favorite_and_shopping_cart': 3,
+    'recipes/get_recipe_short_link': 2,
+    'tags/get_tags_info': 2,
+    'ingredients/get_ingradients': 3,
+    'users/get_user_info': 2,
+    'subscriptions/get_subscriptions': 2,
+    'shopping_cart/download_shopping_cart': 1,
+}
+
+
+def iter_requests(items, path=()):
+    for item in items:
+        if 'item' in item:
+            yield from iter_requests(item['item'], path + (item['name'],))
+        else:
+            yield '/'.join(path), item['name'], item['request']
+
+
+def load_scenarios(collection_path):
+    """Возвращает {папка: [запросы]} в порядке коллекции."""
+    with open(collection_path, encoding='utf-8') as file:
+        collection = json.load(file)
+    scenarios = defaultdict(list)
+    for folder, name, request in iter_requests(collection['item']):
+        headers = {
+            header['key']: header['value']
+            for header in request.get('header', [])
+            if not header.get('disabled')
+        }
+        auth = request.get('auth') or {}
+        if auth.get('type') == 'apikey':
+            options = {
+                option['key']: option['value'] for option in auth['apikey']
+            }
+            headers[options['key']] = options['value']
+        body = request.get('body') or {}
+        url = request['url']
+        scenarios[folder].append({
+            'name': name,
+            'method': request['method'],
+            'url': url['raw'] if isinstance(url, dict) else url,
+            'headers': headers,
+            'body': body.get('raw') if body.get('mode') == 'raw' else None,
+            # Папки *bad_requests проверяют ошибки клиента, для них
+            # ошибкой считаются только 5xx.
+            'expect_client_error': 'bad_requests' in folder,
+        })
+    variables = {
+        variable['key']: variable['value']
+        for variable in collection.get('variable', [])
+    }
+    return scenarios, variables
+
+
+def substitute(template, variables):
+    return VARIABLE_RE.sub(
+        lambda match: str(variables.get(match[1], match[0])), template
+    )
+
+
+def endpoint_key(request):
+    """Эндпоинт в отчёте: метод и шаблон URL без базового адреса."""
+    return f'{request["method"]} {request["url"].replace("{{baseUrl}}", "")}'
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, key, elapsed, failed):
+        self.latencies[key].append(elapsed)
+        if failed:
+            self.errors[key] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        for key, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            rows[key] = {
+                'requests': len(latencies),
+                'rps': len(latencies) / elapsed,
+                'error_rate': self.errors[key] / len(latencies),
+                **{
+                    f'p{percentile}_ms': 1000 * latencies[min(
+                        len(latencies) - 1,
+                        int(len(latencies) * percentile / 100)
+                    )]
+                    for percentile in PERCENTILES
+                },
+            }
+        return rows
+
+
+async def register(client, number, run_id):
+    username = f'load-{run_id}-{number}'
+    user = {
+        'username': username,
+        'email': f'{username}@example.com',
+        'first_name': 'Нагрузка',
+        'last_name': str(number),
+        'password': PASSWORD,
+    }
+    response = await client.post('/api/users/', json=user)
+    response.raise_for_status()
+    user['id'] = response.json()['id']
+    response = await client.post('/api/auth/token/login/', json={
+        'email': user['email'], 'password': PASSWORD,
+    })
+    response.raise_for_status()
+    user['token'] = response.json()['auth_token']
+    return user
+
+
+async def prepare(client, base_variables, concurrency, run_id):
+    """Регистрирует виртуальных пользователей и собирает id объектов."""
+    accounts = await asyncio.gather(*(
+        register(client, number, run_id)
+        for number in range(max(concurrency, 3))
+    ))
+    tags = (await client.get('/api/tags/')).json()
+    ingredients = (await client.get('/api/ingredients/')).json()
+    recipes = (await client.get('/api/recipes/?limit=5')).json()['results']
+    if len(tags) < 3 or len(ingredients) < 2 or len(recipes) < 5:
+        sys.exit(
+            'Нужны минимум 3 тега, 2 ингредиента и 5 рецептов: '
+            'выполните import_ingredients и generate_data.'
+        )
+    shared = dict(base_variables)
+    ordinals = ('first', 'second', 'third', 'fourth', 'fifth')
+    for ordinal, tag in zip(ordinals, tags):
+        shared[f'{ordinal}TagId'] = tag['id']
+        shared[f'{ordinal}TagSlug'] = tag['slug']
+    for ordinal, ingredient in zip(ordinals, ingredients):
+        shared[f'{ordinal}IndredientId'] = ingredient['id']
+    shared['ingredientNameFirstLatter'] = ingredients[0]['name'][0]
+    for ordinal, recipe in zip(ordinals, recipes):
+        shared[f'{ordinal}RecipeId'] = recipe['id']
+    per_user = []
+    for number, account in enumerate(accounts):
+        second = accounts[(number + 1) % len(accounts)]
+        third = accounts[(number + 2) % len(accounts)]
+        per_user.append({
+            **shared,
+            'userId': account['id'],
+            'userToken': account['token'],
+            'username': json.dumps(account['username']),
+            'email': json.dumps(account['email']),
+            'password': json.dumps(PASSWORD),
+            'secondUserId': second['id'],
+            'secondUserToken': second['token'],
+            'thirdUserId': third['id'],
+        })
+    return per_user[:concurrency]
+
+
+async def run_request(client, request, variables, stats):
+    headers = {
+        key: substitute(value, variables)
+        for key, value in request['headers'].items()
+    }
+    content = None
+    if request['body'] and request['method'] != 'GET':
+        content = substitute(request['body'], variables).encode()
+        headers['Content-Type'] = 'application/json'
+    started = time.perf_counter()
+    try:
+        response = await client.request(
+            request['method'],
+            substitute(request['url'], variables),
+            headers=headers,
+            content=content,
+        )
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None
+    elapsed = time.perf_counter() - started
+    if status is None or status >= 500:
+        failed = True
+    else:
+        failed = status >= 400 and not request['expect_client_error']
+    stats.add(endpoint_key(request), elapsed, failed)
+
+
+async def virtual_user(client, scenarios, weights, variables, stats,
+                       deadline, iterations, rng):
+    names = list(weights)
+    completed = 0
+    while time.perf_counter() < deadline and (
+        iterations is None or completed < iterations
+    ):
+        name = rng.choices(names, weights=[weights[n] for n in names])[0]
+        for request in scenarios[name]:
+            await run_request(client, request, variables, stats)
+        completed += 1
+
+
+def parse_weights(values, scenarios):
+    weights = dict(DEFAULT_WEIGHTS) if not values else {}
+    for value in values or ():
+        name, _, weight = value.rpartition('=')
+        weights[name] = float(weight)
+    unknown = set(weights) - set(scenarios)
+    if unknown:
+        sys.exit(
+            f'Нет таких папок в коллекции: {", ".join(sorted(unknown))}.\n'
+            f'Доступны: {", ".join(sorted(scenarios))}'
+        )
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def print_report(rows, elapsed):
+    total = sum(row['requests'] for row in rows.values())
+    errors = sum(row['requests'] * row['error_rate'] for row in rows.values())
+    print(
+        f'{"Эндпоинт":<62} {"запр.":>6} {"RPS":>7} {"p50":>7} '
+        f'{"p95":>7} {"p99":>7} {"ошибки":>7}'
+    )
+    for key, row in rows.items():
+        print(
+            f'{key[:62]:<62} {row["requests"]:>6} {row["rps"]:>7.1f} '
+            f'{row["p50_ms"]:>7.1f} {row["p95_ms"]:>7.1f} '
+            f'{row["p99_ms"]:>7.1f} {row["error_rate"]:>7.1%}'
+        )
+    print(
+        f'Всего {total} запросов за {elapsed:.1f} с: '
+        f'{total / elapsed:.1f} RPS, ошибок {errors / (total or 1):.2%}'
+    )
+
+
+def print_comparison(rows, path):
+    """Отношение p50/p95 и RPS к прогону из сохранённого JSON."""
+    with open(path, encoding='utf-8') as file:
+        previous = json.load(file)['endpoints']
+    print(f'Сравнение с {path} (текущий / прошлый):')
+    for key, row in rows.items():
+        if key not in previous:
+            continue
+        old = previous[key]
+        print(
+            f'{key[:62]:<62} RPS x{row["rps"] / old["rps"]:.2f}, '
+            f'p50 x{row["p50_ms"] / old["p50_ms"]:.2f}, '
+            f'p95 x{row["p95_ms"] / old["p95_ms"]:.2f}'
+        )
+
+
+async def main(arguments):
+    scenarios, base_variables = load_scenarios(arguments.collection)
+    if arguments.list:
+        for name, requests in scenarios.items():
+            print(f'{name} ({len(requests)})')
+        return
+    weights = parse_weights(arguments.weight, scenarios)
+    base_variables['baseUrl'] = arguments.base_url.rstrip('/')
+    limits = httpx.Limits(max_connections=arguments.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_variables['baseUrl'],
+        limits=limits,
+        timeout=REQUEST_TIMEOUT,
+    ) as client:
+        users = await prepare(
+            client, base_variables, arguments.concurrency,
+            uuid.uuid4().hex[:8]
+        )
+        stats = Stats()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(
+                client, scenarios, weights, variables, stats,
+                started + arguments.duration, arguments.iterations,
+                random.Random(arguments.seed + number),
+            )
+            for number, variables in enumerate(users)
+        ))
+        elapsed = time.perf_counter() - started
+    rows = stats.report(elapsed)
+    print_report(rows, elapsed)
+    if arguments.compare:
+        print_comparison(rows, arguments.compare)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as file:
+            json.dump({
+                'base_url': base_variables['baseUrl'],
+                'concurrency': arguments.concurrency,
+                'seed': arguments.seed,
+                'weights': weights,
+                'elapsed': elapsed,
+                'endpoints': rows,
+            }, file, ensure_ascii=False, indent=2)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--collection', default=COLLECTION_PATH)
+    parser.add_argument(
+        '--concurrency', type=int, default=10,
+        help='Число виртуальных пользователей'
+    )
+    parser.add_argument(
+        '--duration', type=float, default=30, help='Длительность, секунды'
+    )
+    parser.add_argument(
+        '--iterations', type=int,
+        help='Сценариев на пользователя (вместо ограничения по времени)'
+    )
+    parser.add_argument(
+        '--weight', action='append', metavar='ПАПКА=ВЕС',
+        help='Вес сценария; если задан, заменяет набор по умолчанию'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Файл для результатов в JSON')
+    parser.add_argument(
+        '--compare', help='JSON предыдущего прогона для сравнения'
+    )
+    parser.add_argument(
+        '--list', action='store_true', help='Показать папки коллекции'
+    )
+    arguments = parser.parse_args()
+    if arguments.iterations is not None:
+        arguments.duration = float('inf')
+    return arguments
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_arguments()))